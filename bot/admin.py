@@ -1,3 +1,17 @@
+from django.contrib import admin
+from .models import ReminderDelivery, SchedulerState
 
 
-# Register your models here.
+@admin.register(SchedulerState)
+class SchedulerStateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'watermark', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'scheduled_for', 'status', 'attempts', 'sent_at')
+    list_filter = ('status',)
+    list_select_related = ('habit',)
+    raw_id_fields = ('habit',)
+    readonly_fields = ('created_at', 'updated_at')
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from bot import telegram
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReminderMessage:
+    """Готовое к отправке напоминание"""
+    habit_id: int
+    chat_id: str
+    text: str
+
+
+@dataclass(frozen=True)
+class DeliveryResult:
+    """Результат отправки одного напоминания"""
+    habit_id: int
+    chat_id: str
+    ok: bool
+    error: str = None
+    retry_after: float = None
+
+
+async def _deliver_one(message, semaphore, loop, executor, sender):
+    async with semaphore:
+        try:
+            # Блокирующий HTTP-вызов уходит в поток: соединения берутся из общего keep-alive пула
+            result = await loop.run_in_executor(executor, sender, message.chat_id, message.text)
+        except Exception as e:
+            logger.error(f"Ошибка отправки напоминания для привычки {message.habit_id}: {e}")
+            return DeliveryResult(message.habit_id, message.chat_id, False, str(e))
+    return DeliveryResult(
+        message.habit_id,
+        message.chat_id,
+        bool(result),
+        getattr(result, 'error', None),
+        getattr(result, 'retry_after', None),
+    )
+
+
+async def deliver_messages(messages, concurrency=None, sender=None):
+    """Параллельная отправка пакета напоминаний не более чем в concurrency потоков"""
+    concurrency = concurrency or settings.TELEGRAM_DELIVERY_CONCURRENCY
+    sender = sender or telegram.send_message
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='telegram-delivery') as executor:
+        return await asyncio.gather(*(
+            _deliver_one(message, semaphore, loop, executor, sender) for message in messages
+        ))
+
+
+def deliver_batch(messages, concurrency=None, sender=None):
+    """Синхронная обёртка для задач Celery: результаты в порядке исходных сообщений"""
+    if not messages:
+        return []
+    return asyncio.run(deliver_messages(messages, concurrency=concurrency, sender=sender))
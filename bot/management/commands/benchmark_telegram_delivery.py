@@ -0,0 +1,59 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from bot import ratelimit, telegram
+from bot.delivery import ReminderMessage, deliver_batch
+from bot.testing import StubTelegramServer
+
+
+class Command(BaseCommand):
+    help = 'Замер пропускной способности отправки напоминаний: синхронно и через asyncio-движок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Количество сообщений')
+        parser.add_argument('--latency', type=float, default=0.05, help='Задержка ответа заглушки, сек')
+        parser.add_argument('--concurrency', type=int, default=10, help='Параллельность asyncio-движка')
+
+    def handle(self, *args, **options):
+        messages = [
+            ReminderMessage(habit_id=i, chat_id=str(100000 + i), text=f"Напоминание {i}")
+            for i in range(options['messages'])
+        ]
+
+        with StubTelegramServer(delay=options['latency']) as server, override_settings(
+            TELEGRAM_API_URL=server.url,
+            TELEGRAM_BOT_TOKEN='benchmark-token',
+            TELEGRAM_HTTP_POOL_SIZE=options['concurrency'],
+            # Замеряется сам транспорт, лимиты частоты Telegram здесь не применяются
+            TELEGRAM_RATE_LIMIT_BACKEND='memory',
+            TELEGRAM_RATE_LIMIT_GLOBAL_RATE=10 ** 6,
+            TELEGRAM_RATE_LIMIT_GLOBAL_BURST=10 ** 6,
+        ):
+            telegram.close_session()
+            ratelimit.reset_rate_limiter()
+            try:
+                started = time.perf_counter()
+                for message in messages:
+                    telegram.send_message(message.chat_id, message.text)
+                sync_elapsed = time.perf_counter() - started
+
+                started = time.perf_counter()
+                results = deliver_batch(messages, concurrency=options['concurrency'])
+                async_elapsed = time.perf_counter() - started
+            finally:
+                telegram.close_session()
+                ratelimit.reset_rate_limiter()
+
+        report = {
+            'messages': len(messages),
+            'latency_seconds': options['latency'],
+            'concurrency': options['concurrency'],
+            'sync_messages_per_second': round(len(messages) / sync_elapsed, 1),
+            'async_messages_per_second': round(len(messages) / async_elapsed, 1),
+            'async_failed': sum(not result.ok for result in results),
+            'speedup': round(sync_elapsed / async_elapsed, 2),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
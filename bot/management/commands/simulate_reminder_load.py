@@ -0,0 +1,202 @@
+import json
+import random
+import statistics
+import time
+from datetime import time as dt_time, timedelta
+from unittest.mock import patch
+
+from celery import current_app
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from bot import ratelimit, tasks, telegram
+from bot.models import SchedulerState
+from bot.testing import StubTelegramServer
+from habits.models import Habit
+
+User = get_user_model()
+
+TIMEZONES = ['Europe/Moscow', 'Europe/Moscow', 'Europe/Moscow', 'Europe/Kaliningrad', 'Asia/Yekaterinburg',
+             'Asia/Novosibirsk', 'Asia/Vladivostok', 'UTC']
+PERIODICITY_WEIGHTS = {1: 60, 2: 10, 3: 10, 4: 3, 5: 3, 6: 2, 7: 12}
+
+
+def random_habit_time(rng):
+    """Время привычки: утренний и вечерний пики плюс равномерный фон"""
+    roll = rng.random()
+    if roll < 0.6:
+        minutes = rng.gauss(8 * 60, 45)
+    elif roll < 0.9:
+        minutes = rng.gauss(20 * 60, 60)
+    else:
+        minutes = rng.uniform(0, 24 * 60)
+    minutes = int(minutes) % (24 * 60)
+    return dt_time(minutes // 60, minutes % 60)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочная симуляция планировщика напоминаний: сидирование данных, '
+            'заглушка Telegram API, eager Celery и отчёт в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('--habits-per-user', type=float, default=3, help='Среднее число привычек на пользователя')
+        parser.add_argument('--window-hours', type=float, default=24,
+                            help='Длина окна планировщика, за которое собираются напоминания')
+        parser.add_argument('--latency', type=float, default=0.01, help='Задержка ответа заглушки Telegram, сек')
+        parser.add_argument('--batch-size', type=int, default=None, help='BOT_REMINDER_BATCH_SIZE для прогона')
+        parser.add_argument('--shards', type=int, default=None, help='BOT_SCHEDULER_SHARDS для прогона')
+        parser.add_argument('--rate-limit', action='store_true',
+                            help='Учитывать лимиты частоты Telegram (по умолчанию отключены)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не откатывать созданные данные (по умолчанию всё откатывается)')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['batch_size'] is not None:
+            overrides['BOT_REMINDER_BATCH_SIZE'] = options['batch_size']
+        if options['shards'] is not None:
+            overrides['BOT_SCHEDULER_SHARDS'] = options['shards']
+        if not options['rate_limit']:
+            overrides.update(
+                TELEGRAM_RATE_LIMIT_BACKEND='memory',
+                TELEGRAM_RATE_LIMIT_GLOBAL_RATE=10 ** 6,
+                TELEGRAM_RATE_LIMIT_GLOBAL_BURST=10 ** 6,
+                TELEGRAM_RATE_LIMIT_CHAT_RATE=10 ** 6,
+                TELEGRAM_RATE_LIMIT_CHAT_BURST=10 ** 6,
+            )
+
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        try:
+            with StubTelegramServer(delay=options['latency']) as server, override_settings(
+                TELEGRAM_API_URL=server.url,
+                TELEGRAM_BOT_TOKEN='simulation-token',
+                **overrides,
+            ):
+                telegram.close_session()
+                ratelimit.reset_rate_limiter()
+                with transaction.atomic():
+                    report = self.simulate(server, options)
+                    if not options['keep']:
+                        transaction.set_rollback(True)
+        finally:
+            current_app.conf.task_always_eager = eager
+            telegram.close_session()
+            ratelimit.reset_rate_limiter()
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, options, now):
+        rng = random.Random(options['seed'])
+        suffix = int(now.timestamp())
+
+        users = User.objects.bulk_create([
+            User(
+                username=f'loadsim_{suffix}_{i}',
+                password='!',  # без хеширования пароля: пользователи только для симуляции
+                telegram_chat_id=str(900000000 + i),
+                timezone=rng.choice(TIMEZONES),
+            )
+            for i in range(options['users'])
+        ], batch_size=1000)
+        if not all(user.pk for user in users):
+            users = list(User.objects.filter(username__startswith=f'loadsim_{suffix}_'))
+
+        window_start = now - timedelta(hours=options['window_hours'])
+        periodicities = list(PERIODICITY_WEIGHTS)
+        weights = list(PERIODICITY_WEIGHTS.values())
+
+        habits = []
+        for user in users:
+            count = max(1, round(rng.expovariate(1 / options['habits_per_user'])))
+            for _ in range(count):
+                habit = Habit(
+                    user=user,
+                    place='Дом',
+                    time=random_habit_time(rng),
+                    action='Симуляция',
+                    duration=rng.randint(10, 120),
+                    periodicity=rng.choices(periodicities, weights)[0],
+                )
+                # Часть привычек выполнена недавно и по периодичности ещё не наступила
+                if rng.random() < 0.5:
+                    habit.last_completed = window_start - timedelta(days=rng.randint(0, 6))
+                habit.next_reminder_at = habit.calculate_next_reminder(window_start)
+                habits.append(habit)
+        Habit.objects.bulk_create(habits, batch_size=1000)
+
+        SchedulerState.objects.update_or_create(name='check_due_habits', defaults={'watermark': window_start})
+        return len(users), len(habits)
+
+    def simulate(self, server, options):
+        now = timezone.now()
+
+        started = time.perf_counter()
+        users_count, habits_count = self.seed(options, now)
+        seed_seconds = time.perf_counter() - started
+
+        # Фаза 1: сканирование окна - задачи отправки собираются, но не выполняются
+        chunks = []
+        with patch.object(tasks.send_reminder_deliveries, 'delay', side_effect=chunks.append), \
+                CaptureQueriesContext(connection) as scan_queries:
+            started = time.perf_counter()
+            tasks.check_due_habits()
+            scan_seconds = time.perf_counter() - started
+
+        # Фаза 2: отправка собранных пакетов через eager Celery с замером каждого запроса
+        latencies = []
+        send_telegram_message = tasks.send_telegram_message
+
+        def timed_send(chat_id, message):
+            sent_at = time.perf_counter()
+            try:
+                return send_telegram_message(chat_id, message)
+            finally:
+                latencies.append(time.perf_counter() - sent_at)
+
+        sent_count = 0
+        with patch.object(tasks, 'send_telegram_message', timed_send), \
+                CaptureQueriesContext(connection) as send_queries:
+            started = time.perf_counter()
+            for chunk in chunks:
+                sent_count += tasks.send_reminder_deliveries.delay(chunk).get()
+            send_seconds = time.perf_counter() - started
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'users': users_count,
+            'habits': habits_count,
+            'window_hours': options['window_hours'],
+            'seed_seconds': round(seed_seconds, 3),
+            'due_reminders': sum(len(chunk) for chunk in chunks),
+            'send_tasks': len(chunks),
+            'scan_seconds': round(scan_seconds, 4),
+            'scan_queries': len(scan_queries.captured_queries),
+            'send_seconds': round(send_seconds, 3),
+            'send_queries': len(send_queries.captured_queries),
+            'messages_sent': sent_count,
+            'stub_messages': len(server.messages),
+            'stub_connections': server.connections,
+            'messages_per_second': round(sent_count / send_seconds, 1) if send_seconds else None,
+            'send_latency_ms': {
+                'mean': ms(statistics.fmean(latencies)) if latencies else None,
+                'p50': ms(percentile(latencies, 50)),
+                'p95': ms(percentile(latencies, 95)),
+                'p99': ms(percentile(latencies, 99)),
+            },
+        }
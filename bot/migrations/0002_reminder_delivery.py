@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0001_initial'),
+        ('habits', '0005_recalculate_next_reminder_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_for', models.DateTimeField(verbose_name='Запланировано на')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Последняя ошибка')),
+                ('available_at', models.DateTimeField(verbose_name='Отправлять не раньше')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='habits.habit', verbose_name='Привычка')),
+            ],
+            options={
+                'verbose_name': 'Отправка напоминания',
+                'verbose_name_plural': 'Отправки напоминаний',
+                'indexes': [models.Index(fields=['status', 'available_at'], name='reminder_delivery_queue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('habit', 'scheduled_for'), name='unique_reminder_delivery_slot')],
+            },
+        ),
+    ]
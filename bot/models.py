@@ -0,0 +1,61 @@
+from django.db import models
+
+
+class SchedulerState(models.Model):
+    """Состояние периодической задачи планировщика
+
+    watermark - момент, до которого (включительно) напоминания уже поставлены в очередь.
+    Каждый запуск обрабатывает полуинтервал (watermark, now] и сдвигает watermark.
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name='Задача')
+    watermark = models.DateTimeField(null=True, blank=True, verbose_name='Обработано до')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Состояние планировщика'
+        verbose_name_plural = 'Состояния планировщика'
+
+    def __str__(self):
+        return f"{self.name}: {self.watermark}"
+
+
+class ReminderDelivery(models.Model):
+    """Запись outbox: одно напоминание о привычке для конкретного времени
+
+    Уникальность (habit, scheduled_for) защищает от дублей при пересекающихся запусках
+    планировщика, а статус и счётчик попыток позволяют повторять неудачные отправки.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENDING, 'Отправляется'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    habit = models.ForeignKey('habits.Habit', on_delete=models.CASCADE, related_name='deliveries',
+                              verbose_name='Привычка')
+    scheduled_for = models.DateTimeField(verbose_name='Запланировано на')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')
+    last_error = models.TextField(blank=True, default='', verbose_name='Последняя ошибка')
+    available_at = models.DateTimeField(verbose_name='Отправлять не раньше')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата отправки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Отправка напоминания'
+        verbose_name_plural = 'Отправки напоминаний'
+        constraints = [
+            models.UniqueConstraint(fields=['habit', 'scheduled_for'], name='unique_reminder_delivery_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='reminder_delivery_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} @ {self.scheduled_for}: {self.status}"
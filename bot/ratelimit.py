@@ -0,0 +1,172 @@
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+
+class MemoryRateLimiter:
+    """Token bucket в памяти процесса: общий на бота и отдельный на каждый чат
+
+    Подходит для тестов и одного воркера. Для нескольких воркеров используется RedisRateLimiter.
+    """
+
+    def __init__(self, global_rate, global_burst, chat_rate, chat_burst):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._buckets = {}
+        self._blocked_until = {}
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, rate, burst, now):
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        return min(burst, tokens + (now - updated_at) * rate)
+
+    def reserve(self, chat_id):
+        """Забрать токен для сообщения в чат; вернуть 0 или сколько секунд нужно подождать"""
+        now = time.monotonic()
+        chat_key = f'chat:{chat_id}'
+
+        with self._lock:
+            blocked = max(self._blocked_until.get('global', 0), self._blocked_until.get(chat_key, 0))
+            if blocked > now:
+                return blocked - now
+
+            global_tokens = self._tokens('global', self.global_rate, self.global_burst, now)
+            chat_tokens = self._tokens(chat_key, self.chat_rate, self.chat_burst, now)
+
+            wait = 0
+            if global_tokens < 1:
+                wait = max(wait, (1 - global_tokens) / self.global_rate)
+            if chat_tokens < 1:
+                wait = max(wait, (1 - chat_tokens) / self.chat_rate)
+            if wait > 0:
+                return wait
+
+            self._buckets['global'] = (global_tokens - 1, now)
+            self._buckets[chat_key] = (chat_tokens - 1, now)
+            return 0
+
+    def block(self, chat_id, seconds):
+        """Запрет отправки в чат (или всему боту при chat_id=None) на seconds секунд"""
+        key = 'global' if chat_id is None else f'chat:{chat_id}'
+        with self._lock:
+            self._blocked_until[key] = max(self._blocked_until.get(key, 0), time.monotonic() + seconds)
+
+
+class RedisRateLimiter:
+    """Token bucket в Redis, общий для всех воркеров Celery
+
+    Проверка и списание токенов обоих bucket'ов выполняются атомарно одним Lua-скриптом.
+    """
+
+    RESERVE_SCRIPT = """
+    local now = tonumber(ARGV[1])
+
+    local blocked = math.max(redis.call('PTTL', KEYS[3]), redis.call('PTTL', KEYS[4]), 0)
+    if blocked > 0 then
+        return tostring(blocked / 1000)
+    end
+
+    local function tokens(key, rate, burst)
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local value = tonumber(state[1]) or burst
+        local updated_at = tonumber(state[2]) or now
+        return math.min(burst, value + math.max(0, now - updated_at) * rate)
+    end
+
+    local global_rate, global_burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+    local chat_rate, chat_burst = tonumber(ARGV[4]), tonumber(ARGV[5])
+    local global_tokens = tokens(KEYS[1], global_rate, global_burst)
+    local chat_tokens = tokens(KEYS[2], chat_rate, chat_burst)
+
+    local wait = 0
+    if global_tokens < 1 then
+        wait = math.max(wait, (1 - global_tokens) / global_rate)
+    end
+    if chat_tokens < 1 then
+        wait = math.max(wait, (1 - chat_tokens) / chat_rate)
+    end
+    if wait > 0 then
+        return tostring(wait)
+    end
+
+    redis.call('HSET', KEYS[1], 'tokens', global_tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(global_burst / global_rate * 1000) + 1000)
+    redis.call('HSET', KEYS[2], 'tokens', chat_tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], math.ceil(chat_burst / chat_rate * 1000) + 1000)
+    return '0'
+    """
+
+    def __init__(self, url, global_rate, global_burst, chat_rate, chat_burst, prefix='telegram:ratelimit'):
+        self.client = redis.Redis.from_url(url)
+        self.args = (global_rate, global_burst, chat_rate, chat_burst)
+        self.prefix = prefix
+        self._reserve = self.client.register_script(self.RESERVE_SCRIPT)
+
+    def reserve(self, chat_id):
+        """Забрать токен для сообщения в чат; вернуть 0 или сколько секунд нужно подождать"""
+        keys = [
+            f'{self.prefix}:bucket:global',
+            f'{self.prefix}:bucket:chat:{chat_id}',
+            f'{self.prefix}:block:global',
+            f'{self.prefix}:block:chat:{chat_id}',
+        ]
+        return float(self._reserve(keys=keys, args=[time.time(), *self.args]))
+
+    def block(self, chat_id, seconds):
+        """Запрет отправки в чат (или всему боту при chat_id=None) на seconds секунд"""
+        key = f'{self.prefix}:block:global' if chat_id is None else f'{self.prefix}:block:chat:{chat_id}'
+        self.client.set(key, 1, px=max(1, int(seconds * 1000)))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Ограничитель частоты отправки, настроенный через TELEGRAM_RATE_LIMIT_*"""
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                rates = dict(
+                    global_rate=settings.TELEGRAM_RATE_LIMIT_GLOBAL_RATE,
+                    global_burst=settings.TELEGRAM_RATE_LIMIT_GLOBAL_BURST,
+                    chat_rate=settings.TELEGRAM_RATE_LIMIT_CHAT_RATE,
+                    chat_burst=settings.TELEGRAM_RATE_LIMIT_CHAT_BURST,
+                )
+                if settings.TELEGRAM_RATE_LIMIT_BACKEND == 'redis':
+                    _limiter = RedisRateLimiter(settings.TELEGRAM_RATE_LIMIT_REDIS_URL, **rates)
+                else:
+                    _limiter = MemoryRateLimiter(**rates)
+    return _limiter
+
+
+def reset_rate_limiter():
+    """Сброс ограничителя (после изменения настроек и в тестах)"""
+    global _limiter
+
+    with _limiter_lock:
+        _limiter = None
+
+
+def acquire(chat_id, max_wait=None):
+    """Дождаться разрешения на отправку не дольше max_wait секунд
+
+    Возвращает 0, если токен получен, иначе рекомендуемую задержку до повторной попытки.
+    """
+    limiter = get_rate_limiter()
+    max_wait = settings.TELEGRAM_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+    deadline = time.monotonic() + max_wait
+
+    while True:
+        wait = limiter.reserve(chat_id)
+        if wait <= 0:
+            return 0
+        if time.monotonic() + wait > deadline:
+            return wait
+        time.sleep(wait)
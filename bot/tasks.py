@@ -1,8 +1,16 @@
-import requests
-from celery import shared_task
+from datetime import datetime, timedelta
+
+from celery import chord, shared_task
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Mod
 from django.utils import timezone
+from habits.cache import bump_user_habits_version
 from habits.models import Habit
+from bot import telegram
+from bot.models import ReminderDelivery, SchedulerState
+from bot.delivery import ReminderMessage, deliver_batch
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,91 +18,319 @@ logger = logging.getLogger(__name__)
 
 def send_telegram_message(chat_id, message):
     """Отправка сообщения через Telegram API"""
-    if not settings.TELEGRAM_BOT_TOKEN:
-        logger.error("TELEGRAM_BOT_TOKEN не настроен")
-        return False
-
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    data = {
-        'chat_id': chat_id,
-        'text': message,
-        'parse_mode': 'HTML'
-    }
-    try:
-        response = requests.post(url, data=data, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"Сообщение отправлено в chat_id {chat_id}")
-            return True
+    return telegram.send_message(chat_id, message)
+
+
+def build_reminder_message(habit):
+    """Текст напоминания о привычке"""
+    message = (
+        f"🔔 <b>Напоминание о привычке!</b>\n\n"
+        f"📍 Место: {habit.place}\n"
+        f"⏰ Время: {habit.time.strftime('%H:%M')}\n"
+        f"🎯 Действие: {habit.action}\n"
+        f"⏱️ Время на выполнение: {habit.duration} секунд"
+    )
+
+    if habit.reward:
+        message += f"\n🎁 Вознаграждение: {habit.reward}"
+    elif habit.related_habit:
+        message += f"\n🔗 Связанная привычка: {habit.related_habit.action}"
+
+    return message
+
+
+def reschedule_habit(habit, now, success, scheduled_for=None):
+    """Перенос next_reminder_at после попытки отправки (без сохранения в БД)
+
+    last_completed не трогается: это время настоящего выполнения, его пишет журнал выполнений.
+    Следующее напоминание отсчитывается от отправленного - scheduled_for записи outbox: после
+    неудачной попытки next_reminder_at уже указывает на следующее время, и повтор не должен его пропустить.
+    """
+    if success:
+        habit.next_reminder_at = habit.calculate_next_reminder(now, after=scheduled_for or habit.next_reminder_at)
+    else:
+        # Каждое время напоминания обрабатывается один раз - переходим к следующему
+        habit.next_reminder_at = habit.calculate_next_reminder(now + timedelta(minutes=1))
+
+
+def chunked(items, size):
+    """Разбиение последовательности на части не больше size элементов"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def enqueue_deliveries(due, now):
+    """Запись напоминаний в outbox; возвращает id ожидающих отправки записей
+
+    due - пары (habit_id, scheduled_for). Уже существующие записи для того же
+    времени не дублируются (INSERT ... ON CONFLICT DO NOTHING).
+    """
+    if not due:
+        return []
+
+    ReminderDelivery.objects.bulk_create(
+        [ReminderDelivery(habit_id=habit_id, scheduled_for=scheduled_for, available_at=now)
+         for habit_id, scheduled_for in due],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    return list(ReminderDelivery.objects.filter(
+        habit_id__in=[habit_id for habit_id, _ in due],
+        status=ReminderDelivery.STATUS_PENDING,
+        available_at__lte=now,
+    ).values_list('id', flat=True))
+
+
+def dispatch_deliveries(delivery_ids):
+    """Постановка задач отправки пакетами по BOT_REMINDER_BATCH_SIZE записей"""
+    for chunk in chunked(delivery_ids, max(1, settings.BOT_REMINDER_BATCH_SIZE)):
+        send_reminder_deliveries.delay(chunk)
+
+
+def claim_deliveries(delivery_ids, now):
+    """Захват ожидающих записей outbox текущим воркером
+
+    Строки, заблокированные другим воркером, пропускаются (SKIP LOCKED), поэтому
+    повторная постановка одного пакета не приводит к повторной отправке.
+    """
+    with transaction.atomic():
+        deliveries = list(
+            ReminderDelivery.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('habit__user', 'habit__related_habit')
+            .filter(id__in=delivery_ids, status=ReminderDelivery.STATUS_PENDING, available_at__lte=now)
+        )
+        if deliveries:
+            ReminderDelivery.objects.filter(id__in=[delivery.id for delivery in deliveries]).update(
+                status=ReminderDelivery.STATUS_SENDING,
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+
+    for delivery in deliveries:
+        delivery.status = ReminderDelivery.STATUS_SENDING
+        delivery.attempts += 1
+    return deliveries
+
+
+def _fail_delivery(delivery, now, error):
+    delivery.status = ReminderDelivery.STATUS_FAILED
+    delivery.last_error = error or ''
+    # Повтор с экспоненциальной паузой; после BOT_DELIVERY_MAX_ATTEMPTS запись остаётся failed
+    delay = settings.BOT_DELIVERY_RETRY_DELAY * 2 ** (delivery.attempts - 1)
+    delivery.available_at = now + timedelta(seconds=delay)
+
+
+@shared_task
+def send_reminder_deliveries(delivery_ids):
+    """Отправка пакета напоминаний из outbox
+
+    Захват, отправка и запись результатов выполняются постоянным числом запросов
+    независимо от размера пакета.
+    """
+    now = timezone.now()
+    deliveries = claim_deliveries(delivery_ids, now)
+
+    sending = []
+    messages = []
+    for delivery in deliveries:
+        user = delivery.habit.user
+        if not user.telegram_chat_id:
+            logger.warning(f"У пользователя {user.username} не установлен telegram_chat_id")
+            _fail_delivery(delivery, now, "Не установлен telegram_chat_id")
+            continue
+        sending.append(delivery)
+        messages.append(ReminderMessage(delivery.habit_id, user.telegram_chat_id, build_reminder_message(delivery.habit)))
+
+    # Сообщения пакета отправляются параллельно, результаты возвращаются в исходном порядке
+    results = deliver_batch(messages, sender=send_telegram_message)
+
+    sent_count = 0
+    rate_limited = {}
+    for delivery, result in zip(sending, results):
+        if result.ok:
+            delivery.status = ReminderDelivery.STATUS_SENT
+            delivery.sent_at = now
+            delivery.last_error = ''
+            sent_count += 1
+        elif result.retry_after:
+            # Упёрлись в лимит Telegram: запись возвращается в очередь после паузы, а не теряется
+            delivery.status = ReminderDelivery.STATUS_PENDING
+            delivery.available_at = now + timedelta(seconds=result.retry_after)
+            delivery.last_error = result.error or ''
+            rate_limited.setdefault(result.retry_after, []).append(delivery.id)
         else:
-            logger.error(f"Ошибка Telegram API: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        logger.error(f"Ошибка отправки в Telegram: {e}")
-        return False
+            _fail_delivery(delivery, now, result.error)
+
+    habits = {}
+    for delivery in deliveries:
+        delivery.updated_at = now
+        habit = delivery.habit
+        if delivery.status == ReminderDelivery.STATUS_SENT:
+            reschedule_habit(habit, now, True, delivery.scheduled_for)
+        elif delivery.status == ReminderDelivery.STATUS_FAILED and habit.next_reminder_at == delivery.scheduled_for:
+            reschedule_habit(habit, now, False)
+        else:
+            continue
+        habits[habit.id] = habit
+
+    if deliveries:
+        ReminderDelivery.objects.bulk_update(
+            deliveries, ['status', 'sent_at', 'last_error', 'available_at', 'updated_at']
+        )
+    if habits:
+        Habit.objects.bulk_update(habits.values(), ['next_reminder_at'])
+        # bulk_update не шлёт сигналов - ETag владельцев сбрасываем явно
+        bump_user_habits_version(*(habit.user_id for habit in habits.values()))
+
+    # Отложенные по 429 записи ставятся в очередь ровно на retry_after, не дожидаясь сборщика
+    for retry_after, ids in rate_limited.items():
+        for chunk in chunked(ids, max(1, settings.BOT_REMINDER_BATCH_SIZE)):
+            send_reminder_deliveries.apply_async((chunk,), countdown=retry_after)
+
+    return sent_count
+
+
+@shared_task
+def send_habit_reminders(habit_ids):
+    """Отправка напоминаний по id привычек (через outbox)"""
+    now = timezone.now()
+
+    # Привычки, уже обработанные другой задачей, отсекаются условием на next_reminder_at
+    due = list(Habit.objects.due_between(None, now).filter(id__in=habit_ids).values_list('id', 'next_reminder_at'))
+
+    return send_reminder_deliveries(enqueue_deliveries(due, now))
 
 
 @shared_task
 def send_habit_reminder(habit_id):
     """Отправка напоминания о привычке"""
-    try:
-        habit = Habit.objects.get(id=habit_id)
-        user = habit.user
+    return send_habit_reminders([habit_id]) > 0
 
-        if not user.telegram_chat_id:
-            logger.warning(f"У пользователя {user.username} не установлен telegram_chat_id")
-            return False
-
-        message = (
-            f"🔔 <b>Напоминание о привычке!</b>\n\n"
-            f"📍 Место: {habit.place}\n"
-            f"⏰ Время: {habit.time.strftime('%H:%M')}\n"
-            f"🎯 Действие: {habit.action}\n"
-            f"⏱️ Время на выполнение: {habit.duration} секунд"
+
+@shared_task
+def retry_reminder_deliveries():
+    """Повторная постановка в очередь неудачных и зависших отправок
+
+    Записи захватываются пакетом через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько одновременных запусков не берут одни и те же строки.
+    """
+    now = timezone.now()
+    retryable = (
+        Q(status=ReminderDelivery.STATUS_FAILED, attempts__lt=settings.BOT_DELIVERY_MAX_ATTEMPTS,
+          available_at__lte=now)
+        | Q(status=ReminderDelivery.STATUS_PENDING, available_at__lte=now,
+            updated_at__lt=now - timedelta(seconds=settings.BOT_DELIVERY_PENDING_TIMEOUT))
+        # Зависшие при отправке - тоже не больше BOT_DELIVERY_MAX_ATTEMPTS: сообщение, роняющее воркер, не зациклится
+        | Q(status=ReminderDelivery.STATUS_SENDING, attempts__lt=settings.BOT_DELIVERY_MAX_ATTEMPTS,
+            updated_at__lt=now - timedelta(seconds=settings.BOT_DELIVERY_SENDING_TIMEOUT))
+    )
+
+    with transaction.atomic():
+        delivery_ids = list(
+            ReminderDelivery.objects.select_for_update(skip_locked=True)
+            .filter(retryable)
+            .order_by('available_at')
+            .values_list('id', flat=True)[:settings.BOT_DELIVERY_RETRY_BATCH]
         )
+        ReminderDelivery.objects.filter(id__in=delivery_ids).update(
+            status=ReminderDelivery.STATUS_PENDING,
+            available_at=now,
+            updated_at=now,
+        )
+
+    dispatch_deliveries(delivery_ids)
+
+    if delivery_ids:
+        logger.info(f"Повторно поставлено отправок: {len(delivery_ids)}")
+    return len(delivery_ids)
+
+
+def claim_scheduler_window(name, now):
+    """Забрать полуинтервал (watermark, now] и сдвинуть watermark
 
-        if habit.reward:
-            message += f"\n🎁 Вознаграждение: {habit.reward}"
-        elif habit.related_habit:
-            message += f"\n🔗 Связанная привычка: {habit.related_habit.action}"
+    Строка состояния блокируется, поэтому пересекающиеся запуски получают непересекающиеся окна.
+    Возвращает (начало, конец) окна или None, если обрабатывать нечего.
+    """
+    with transaction.atomic():
+        state, _ = SchedulerState.objects.select_for_update().get_or_create(name=name)
+        window_start = state.watermark
+        if window_start is not None and window_start >= now:
+            return None
 
-        success = send_telegram_message(user.telegram_chat_id, message)
+        state.watermark = now
+        state.save(update_fields=['watermark', 'updated_at'])
 
-        if success:
-            habit.last_completed = timezone.now()
-            habit.save(update_fields=['last_completed'])
+    return window_start, now
 
-        return success
 
-    except Habit.DoesNotExist:
-        logger.error(f"Привычка с id {habit_id} не найдена")
-        return False
+def due_habits_queryset(window_start, window_end, shard=0, shards=1):
+    """Привычки с напоминанием в окне (window_start, window_end] для одного шарда"""
+    # Периодичность уже учтена в next_reminder_at - достаточно одного запроса по индексу habit_due_idx.
+    # Первый запуск (watermark ещё нет) забирает все просроченные напоминания
+    habits = Habit.objects.due_between(window_start, window_end)
+    if shards > 1:
+        habits = habits.annotate(shard=Mod('id', shards)).filter(shard=shard)
+    return habits
+
+
+def dispatch_due_habits(window_start, window_end, shard=0, shards=1):
+    """Запись в outbox и постановка в очередь напоминаний окна (window_start, window_end] одного шарда"""
+    habits = due_habits_queryset(window_start, window_end, shard, shards)
+    due = list(habits.values_list('id', 'next_reminder_at'))
+
+    now = timezone.now()
+    for chunk in chunked(due, 1000):
+        dispatch_deliveries(enqueue_deliveries(chunk, now))
+
+    return len(due)
+
+
+@shared_task
+def scan_due_habits_shard(shard, shards, window_start, window_end):
+    """Сканирование одного шарда (id % shards == shard) в заданном окне"""
+    window_start = datetime.fromisoformat(window_start) if window_start else None
+    window_end = datetime.fromisoformat(window_end)
+
+    sent_count = dispatch_due_habits(window_start, window_end, shard, shards)
+    logger.info(f"Шард {shard}/{shards}: поставлено напоминаний {sent_count}")
+    return sent_count
+
+
+@shared_task
+def sum_sent_counts(counts):
+    """Итог шардированного запуска check_due_habits"""
+    sent_count = sum(counts)
+    if sent_count > 0:
+        logger.info(f"Отправлено напоминаний: {sent_count}")
+    return sent_count
 
 
 @shared_task
 def check_due_habits():
-    """Проверка привычек, которые нужно выполнить сейчас"""
+    """Постановка в очередь напоминаний, время которых наступило с прошлого запуска
+
+    Возвращает количество поставленных напоминаний. При BOT_SCHEDULER_SHARDS > 1 окно
+    сканируется параллельно задачами-шардами и возвращается None: итог считает chord в sum_sent_counts.
+    """
     now = timezone.now()
-    current_time = now.time()
 
-    logger.info(f"Проверка привычек в {current_time}")
+    window = claim_scheduler_window('check_due_habits', now)
+    if window is None:
+        logger.info(f"Окно до {now} уже обработано другим запуском")
+        return 0
+    window_start, window_end = window
 
-    habits = Habit.objects.filter(
-        time__hour=current_time.hour,
-        time__minute=current_time.minute,
-        is_pleasant=False
-    )
-
-    sent_count = 0
-    for habit in habits:
-        if habit.last_completed:
-            last_date = habit.last_completed.date()
-            days_passed = (now.date() - last_date).days
-            if days_passed < habit.periodicity:
-                continue
+    logger.info(f"Проверка привычек в окне ({window_start}, {window_end}]")
 
-        send_habit_reminder.delay(habit.id)
-        sent_count += 1
+    shards = settings.BOT_SCHEDULER_SHARDS
+    if shards > 1:
+        start = window_start.isoformat() if window_start else None
+        header = [scan_due_habits_shard.s(shard, shards, start, window_end.isoformat()) for shard in range(shards)]
+        result = chord(header)(sum_sent_counts.s())
+        logger.info(f"Окно разбито на {shards} шардов, итог в задаче {result.id}")
+        return None
 
+    sent_count = dispatch_due_habits(window_start, window_end)
     if sent_count > 0:
         logger.info(f"Отправлено напоминаний: {sent_count}")
 
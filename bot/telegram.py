@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+import requests
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from bot import ratelimit
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _create_session():
+    """Сессия с ограниченным пулом keep-alive соединений к Telegram API"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.TELEGRAM_HTTP_POOL_SIZE,
+        pool_block=True,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """HTTP-сессия текущего процесса (после fork создаётся заново)"""
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                # Унаследованную от родителя сессию не закрываем: её сокеты принадлежат родителю
+                _session = _create_session()
+                _session_pid = pid
+    return _session
+
+
+def close_session():
+    """Закрытие соединений пула текущего процесса"""
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
+
+
+def get_timeout():
+    """Таймауты (подключение, чтение) для запросов к Telegram API"""
+    return settings.TELEGRAM_HTTP_CONNECT_TIMEOUT, settings.TELEGRAM_HTTP_READ_TIMEOUT
+
+
+def api_url(method):
+    """URL метода Telegram Bot API"""
+    return f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/{method}"
+
+
+@dataclass(frozen=True)
+class SendResult:
+    """Результат отправки сообщения
+
+    retry_after заполняется, когда сообщение не отправлено из-за лимитов Telegram
+    и его нужно повторить не раньше чем через указанное число секунд.
+    """
+    ok: bool
+    retry_after: float = None
+    error: str = None
+
+    def __bool__(self):
+        return self.ok
+
+
+def _parse_retry_after(response):
+    try:
+        return float(response.json()['parameters']['retry_after'])
+    except (ValueError, KeyError, TypeError):
+        return float(settings.TELEGRAM_RATE_LIMIT_DEFAULT_RETRY_AFTER)
+
+
+def send_message(chat_id, text):
+    """Отправка сообщения через Telegram API с учётом лимитов частоты"""
+    if not settings.TELEGRAM_BOT_TOKEN:
+        logger.error("TELEGRAM_BOT_TOKEN не настроен")
+        return SendResult(False, error="TELEGRAM_BOT_TOKEN не настроен")
+
+    if not chat_id:
+        logger.error("Не указан chat_id получателя")
+        return SendResult(False, error="Не указан chat_id получателя")
+
+    wait = ratelimit.acquire(chat_id)
+    if wait:
+        logger.info(f"Отправка в chat_id {chat_id} отложена лимитом на {wait:.2f} с")
+        return SendResult(False, retry_after=wait, error="Превышен лимит частоты отправки")
+
+    data = {
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': 'HTML'
+    }
+    try:
+        # Пул keep-alive соединений процесса: без нового TCP/TLS-рукопожатия на каждое сообщение
+        response = get_session().post(api_url('sendMessage'), data=data, timeout=get_timeout())
+        if response.status_code == 200:
+            logger.info(f"Сообщение отправлено в chat_id {chat_id}")
+            return SendResult(True)
+        elif response.status_code == 429:
+            retry_after = _parse_retry_after(response)
+            # Пока не истечёт retry_after, в этот чат не отправляем ни из одного воркера
+            ratelimit.get_rate_limiter().block(chat_id, retry_after)
+            logger.warning(f"Telegram ограничил отправку в chat_id {chat_id}, повтор через {retry_after} с")
+            return SendResult(False, retry_after=retry_after, error=response.text)
+        else:
+            logger.error(f"Ошибка Telegram API: {response.status_code} - {response.text}")
+            return SendResult(False, error=response.text)
+    except Exception as e:
+        logger.error(f"Ошибка отправки в Telegram: {e}")
+        return SendResult(False, error=str(e))
+
+
+@worker_process_init.connect
+def init_worker_session(**kwargs):
+    """Свой пул соединений для каждого дочернего процесса воркера Celery"""
+    global _session, _session_pid
+
+    with _session_lock:
+        _session = None
+        _session_pid = None
+    get_session()
+    logger.debug(f"HTTP-сессия Telegram создана в процессе {os.getpid()}")
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_session(**kwargs):
+    close_session()
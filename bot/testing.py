@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего api.telegram.org
+
+    def setup(self):
+        super().setup()
+        self.server.stub.register_connection()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode()
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            data = json.loads(body or '{}')
+        else:
+            data = {key: values[0] for key, values in parse_qs(body).items()}
+
+        status, payload = self.server.stub.handle_message(self.path, data)
+
+        response = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTelegramServer:
+    """Локальная заглушка Telegram Bot API для тестов и замеров
+
+    Принимает sendMessage, запоминает сообщения и считает TCP-соединения,
+    чтобы можно было проверить переиспользование keep-alive пула.
+    """
+
+    def __init__(self, delay=0, responses=None):
+        self.delay = delay
+        self.responses = list(responses or [])
+        self.messages = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), StubTelegramHandler)
+        self._server.daemon_threads = True
+        self._server.block_on_close = False  # keep-alive соединения клиента не держат остановку
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def register_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def handle_message(self, path, data):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        with self._lock:
+            self.in_flight -= 1
+            self.messages.append(data)
+            if self.responses:
+                return self.responses.pop(0)
+
+        return 200, {'ok': True, 'result': {'message_id': len(self.messages), 'chat': {'id': data.get('chat_id')}}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
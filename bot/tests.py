@@ -1,15 +1,44 @@
-from django.test import TestCase
+import json
+import fakeredis
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from celery import current_app
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from unittest.mock import patch, MagicMock
-from bot.tasks import send_telegram_message
+from bot import ratelimit, telegram
+from bot.delivery import ReminderMessage, deliver_batch
+from bot.models import ReminderDelivery, SchedulerState
+from bot.testing import StubTelegramServer
+from bot.tasks import (
+    send_telegram_message, send_habit_reminder, send_habit_reminders, check_due_habits, dispatch_due_habits,
+    sum_sent_counts, send_reminder_deliveries, retry_reminder_deliveries, enqueue_deliveries
+)
 from users.models import User
+from habits.cache import get_user_habits_version
 from habits.models import Habit
-import unittest
 
 
-@unittest.skip("Temporarily skipping Telegram tests")
+# Выборка привычки, outbox (INSERT + выборка id), захват (SAVEPOINT, SELECT FOR UPDATE, UPDATE, RELEASE)
+# и запись результатов (outbox и привычка)
+QUERIES_PER_REMINDER = 9
+
+
+def dispatched_habit_ids(mock_delay):
+    """id привычек из поставленных в очередь задач send_reminder_deliveries"""
+    delivery_ids = [delivery_id for call in mock_delay.call_args_list for delivery_id in call.args[0]]
+    habit_by_delivery = dict(ReminderDelivery.objects.filter(id__in=delivery_ids).values_list('id', 'habit_id'))
+    return [habit_by_delivery[delivery_id] for delivery_id in delivery_ids]
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='test-token')
 class TelegramTasksTest(TestCase):
 
     def setUp(self):
+        ratelimit.reset_rate_limiter()
         self.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
@@ -22,18 +51,20 @@ class TelegramTasksTest(TestCase):
             place="Test place",
             time="12:00:00",
             action="Test action",
+            duration=60,
             is_pleasant=False,
             reward="Test reward",
             is_public=False
         )
 
-    @patch('bot.tasks.requests.post')
-    def test_send_telegram_message_success(self, mock_post):
+    @patch('bot.tasks.telegram.get_session')
+    def test_send_telegram_message_success(self, mock_get_session):
         """Тест успешной отправки сообщения в Telegram"""
         # Настраиваем mock для успешного ответа
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {'ok': True}
+        mock_post = mock_get_session.return_value.post
         mock_post.return_value = mock_response
 
         # Вызываем задачу
@@ -43,13 +74,14 @@ class TelegramTasksTest(TestCase):
         self.assertTrue(result)
         mock_post.assert_called_once()
 
-    @patch('bot.tasks.requests.post')
-    def test_send_telegram_message_failure(self, mock_post):
+    @patch('bot.tasks.telegram.get_session')
+    def test_send_telegram_message_failure(self, mock_get_session):
         """Тест неудачной отправки сообщения в Telegram"""
         # Настраиваем mock для неудачного ответа
         mock_response = MagicMock()
         mock_response.status_code = 400
         mock_response.json.return_value = {'ok': False}
+        mock_post = mock_get_session.return_value.post
         mock_post.return_value = mock_response
 
         # Вызываем задачу
@@ -71,13 +103,590 @@ class TelegramTasksTest(TestCase):
         result = send_telegram_message(user_no_chat.telegram_chat_id, "Test message")
         self.assertFalse(result)
 
-    @patch('bot.tasks.requests.post')
-    def test_send_telegram_message_exception(self, mock_post):
+    @patch('bot.tasks.telegram.get_session')
+    def test_send_telegram_message_exception(self, mock_get_session):
         """Тест исключения при отправки сообщения"""
         # Настраиваем mock для выброса исключения
+        mock_post = mock_get_session.return_value.post
         mock_post.side_effect = Exception("Connection error")
 
         result = send_telegram_message(self.user.telegram_chat_id, "Test message")
 
         self.assertFalse(result)
         mock_post.assert_called_once()
+
+
+class ReminderSchedulingTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='scheduser',
+            password='testpass123',
+            telegram_chat_id='123456789'
+        )
+        self.habit = Habit.objects.create(
+            user=self.user,
+            place="Парк",
+            time="08:00:00",
+            action="Бегать",
+            duration=60,
+            periodicity=2
+        )
+
+    def test_next_reminder_calculated_on_create(self):
+        """Тест: next_reminder_at заполняется при создании, у приятной привычки - нет"""
+        self.assertIsNotNone(self.habit.next_reminder_at)
+        self.assertEqual(self.habit.next_reminder_at.astimezone(self.user.zoneinfo).time(), time(8, 0))
+
+        pleasant = Habit.objects.create(
+            user=self.user, place="Дом", time="09:00:00", action="Читать", duration=60, is_pleasant=True
+        )
+        self.assertIsNone(pleasant.next_reminder_at)
+
+    def test_calculate_next_reminder_respects_periodicity(self):
+        """Тест: следующее напоминание через periodicity дней после выполнения"""
+        self.user.timezone = 'UTC'
+        now = datetime(2025, 1, 10, 12, 0, tzinfo=dt_timezone.utc)
+
+        self.habit.last_completed = datetime(2025, 1, 10, 8, 0, 5, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.habit.calculate_next_reminder(now), datetime(2025, 1, 12, 8, 0, tzinfo=dt_timezone.utc))
+
+        # Давно выполненная привычка напоминается в ближайшее время, а не в прошлом
+        self.habit.last_completed = datetime(2025, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.habit.calculate_next_reminder(now), datetime(2025, 1, 11, 8, 0, tzinfo=dt_timezone.utc))
+
+    @override_settings(BOT_REMINDER_BATCH_SIZE=0)
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_check_due_habits_uses_next_reminder_at(self, mock_delay):
+        """Тест: планировщик отправляет только привычки с next_reminder_at <= now"""
+        future_habit = Habit.objects.create(
+            user=self.user, place="Дом", time="10:00:00", action="Отжиматься", duration=60
+        )
+        Habit.objects.filter(id=self.habit.id).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+        Habit.objects.filter(id=future_habit.id).update(next_reminder_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(check_due_habits(), 1)
+        mock_delay.assert_called_once()
+        self.assertEqual(dispatched_habit_ids(mock_delay), [self.habit.id])
+
+    @patch('bot.tasks.send_telegram_message', return_value=True)
+    def test_send_habit_reminder_moves_next_reminder(self, mock_send):
+        """Тест: после отправки next_reminder_at сдвигается на periodicity дней, повтор не отправляется"""
+        Habit.objects.filter(id=self.habit.id).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+
+        sent_slot = Habit.objects.get(id=self.habit.id).next_reminder_at
+        self.assertTrue(send_habit_reminder(self.habit.id))
+        self.habit.refresh_from_db()
+        # Отправка напоминания - не выполнение привычки
+        self.assertIsNone(self.habit.last_completed)
+        self.assertEqual(
+            self.habit.next_reminder_at.astimezone(self.user.zoneinfo).date(),
+            sent_slot.astimezone(self.user.zoneinfo).date() + timedelta(days=2)
+        )
+
+        # Повторная постановка той же задачи не приводит к дублю сообщения
+        self.assertFalse(send_habit_reminder(self.habit.id))
+        mock_send.assert_called_once()
+
+
+class BatchReminderDispatchTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='batchuser',
+            password='testpass123',
+            telegram_chat_id='123456789'
+        )
+        self.pleasant = Habit.objects.create(
+            user=self.user, place="Дом", time="09:00:00", action="Читать", duration=60, is_pleasant=True
+        )
+        self.habits = [
+            Habit.objects.create(
+                user=self.user, place="Парк", time="08:00:00", action=f"Действие {i}", duration=60,
+                related_habit=self.pleasant if i % 2 else None
+            )
+            for i in range(5)
+        ]
+        Habit.objects.filter(is_pleasant=False).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+
+    @override_settings(BOT_REMINDER_BATCH_SIZE=2)
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_check_due_habits_dispatches_chunks(self, mock_delay):
+        """Тест: напоминания группируются в пакеты заданного размера"""
+        self.assertEqual(check_due_habits(), 5)
+        self.assertEqual(mock_delay.call_count, 3)
+        self.assertCountEqual(dispatched_habit_ids(mock_delay), [habit.id for habit in self.habits])
+
+    @patch('bot.tasks.send_telegram_message', return_value=True)
+    def test_single_reminder_query_count(self, mock_send):
+        """Тест: запросы на одно напоминание - выборка, outbox, захват, отправка и запись результата"""
+        habit = self.habits[0]
+        Habit.objects.filter(id=habit.id).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+        with self.assertNumQueries(QUERIES_PER_REMINDER):
+            self.assertTrue(send_habit_reminder(habit.id))
+
+    @patch('bot.tasks.send_telegram_message', return_value=True)
+    def test_batch_task_uses_constant_queries(self, mock_send):
+        """Тест: число запросов на пакет не зависит от его размера"""
+        now = timezone.now()
+        delivery_ids = enqueue_deliveries([(habit.id, habit.next_reminder_at) for habit in self.habits[:1]], now)
+        with self.assertNumQueries(6) as context:
+            send_reminder_deliveries(delivery_ids)
+        delivery_ids = enqueue_deliveries([(habit.id, now - timedelta(minutes=1)) for habit in self.habits[1:]], now)
+        with self.assertNumQueries(len(context.captured_queries)):
+            sent = send_reminder_deliveries(delivery_ids)
+
+        self.assertEqual(sent, 4)
+        self.assertEqual(mock_send.call_count, 5)
+        self.assertFalse(Habit.objects.filter(is_pleasant=False, next_reminder_at__lte=now).exists())
+        self.assertFalse(Habit.objects.filter(last_completed__isnull=False).exists())
+        self.assertEqual(ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_SENT).count(), 5)
+        messages = [call.args[1] for call in mock_send.call_args_list]
+        self.assertEqual(sum('Связанная привычка: Читать' in message for message in messages), 2)
+
+    @patch('bot.tasks.send_telegram_message', return_value=True)
+    def test_batch_task_skips_already_sent(self, mock_send):
+        """Тест: повторная постановка пакета не дублирует сообщения"""
+        habit_ids = [habit.id for habit in self.habits]
+        send_habit_reminders(habit_ids)
+        self.assertEqual(send_habit_reminders(habit_ids), 0)
+        self.assertEqual(mock_send.call_count, 5)
+
+
+class TelegramHttpClientTest(TestCase):
+
+    def setUp(self):
+        telegram.close_session()
+        ratelimit.reset_rate_limiter()
+        self.server = StubTelegramServer().start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(telegram.close_session)
+
+        settings_override = override_settings(TELEGRAM_API_URL=self.server.url, TELEGRAM_BOT_TOKEN='test-token')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_connection_reused_between_messages(self):
+        """Тест: несколько сообщений уходят через одно keep-alive соединение"""
+        for i in range(5):
+            self.assertTrue(send_telegram_message(f'12345678{i}', f"Сообщение {i}"))
+
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.messages[0]['chat_id'], '123456780')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_session_recreated_in_forked_process(self):
+        """Тест: после fork процесс не использует сессию родителя"""
+        parent_session = telegram.get_session()
+        self.assertIs(telegram.get_session(), parent_session)
+
+        with patch('bot.telegram.os.getpid', return_value=-1):
+            self.assertIsNot(telegram.get_session(), parent_session)
+
+    def test_worker_process_lifecycle(self):
+        """Тест: сигналы Celery создают и закрывают пул процесса"""
+        send_telegram_message('123456781', "До fork")
+
+        telegram.init_worker_session()
+        send_telegram_message('123456782', "После инициализации процесса")
+        self.assertEqual(self.server.connections, 2)
+
+        telegram.shutdown_worker_session()
+        self.assertIsNone(telegram._session)
+
+
+class DeliveryEngineTest(TestCase):
+
+    def setUp(self):
+        telegram.close_session()
+        ratelimit.reset_rate_limiter()
+        self.addCleanup(telegram.close_session)
+
+    def start_server(self, **kwargs):
+        server = StubTelegramServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        settings_override = override_settings(TELEGRAM_API_URL=server.url, TELEGRAM_BOT_TOKEN='test-token')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return server
+
+    def test_results_per_message(self):
+        """Тест: результат возвращается для каждого сообщения в исходном порядке"""
+        server = self.start_server(responses=[(400, {'ok': False, 'description': 'Bad Request'})])
+        messages = [ReminderMessage(habit_id=i, chat_id=str(i), text=f"Сообщение {i}") for i in range(4)]
+
+        results = deliver_batch(messages, concurrency=1)
+
+        self.assertEqual([result.habit_id for result in results], [0, 1, 2, 3])
+        self.assertEqual([result.ok for result in results], [False, True, True, True])
+        self.assertEqual(len(server.messages), 4)
+
+    def test_concurrency_limit(self):
+        """Тест: одновременно отправляется не больше concurrency сообщений"""
+        server = self.start_server(delay=0.05)
+        messages = [ReminderMessage(habit_id=i, chat_id=str(i), text="Сообщение") for i in range(12)]
+
+        results = deliver_batch(messages, concurrency=3)
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertLessEqual(server.max_in_flight, 3)
+        self.assertGreater(server.max_in_flight, 1)
+
+    def test_sender_exception_is_reported(self):
+        """Тест: исключение отправителя превращается в неуспешный результат"""
+        def failing_sender(chat_id, text):
+            raise RuntimeError("Connection error")
+
+        results = deliver_batch([ReminderMessage(habit_id=1, chat_id='1', text="Сообщение")], sender=failing_sender)
+
+        self.assertFalse(results[0].ok)
+        self.assertEqual(results[0].error, "Connection error")
+
+
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        telegram.close_session()
+        ratelimit.reset_rate_limiter()
+        self.addCleanup(telegram.close_session)
+        self.addCleanup(ratelimit.reset_rate_limiter)
+
+    def start_server(self, **kwargs):
+        server = StubTelegramServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        settings_override = override_settings(TELEGRAM_API_URL=server.url, TELEGRAM_BOT_TOKEN='test-token')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return server
+
+    def test_memory_limiter_global_and_chat_buckets(self):
+        """Тест: общий лимит и лимит чата считаются раздельно"""
+        limiter = ratelimit.MemoryRateLimiter(global_rate=2, global_burst=2, chat_rate=1, chat_burst=1)
+
+        self.assertEqual(limiter.reserve('1'), 0)
+        self.assertGreater(limiter.reserve('1'), 0)  # второй раз в тот же чат - ждать
+        self.assertEqual(limiter.reserve('2'), 0)
+        self.assertGreater(limiter.reserve('3'), 0)  # общий bucket исчерпан
+
+        limiter.block('4', 30)
+        self.assertGreater(limiter.reserve('4'), 29)
+
+    @patch('bot.ratelimit.redis.Redis.from_url', side_effect=lambda url: fakeredis.FakeRedis())
+    def test_redis_limiter_global_and_chat_buckets(self, from_url):
+        """Тест: Lua-скрипт Redis-лимитера ведёт себя как bucket'ы в памяти"""
+        limiter = ratelimit.RedisRateLimiter(
+            'redis://fake', global_rate=2, global_burst=2, chat_rate=1, chat_burst=1
+        )
+
+        self.assertEqual(limiter.reserve('1'), 0)
+        self.assertGreater(limiter.reserve('1'), 0)  # второй раз в тот же чат - ждать
+        self.assertEqual(limiter.reserve('2'), 0)
+        self.assertGreater(limiter.reserve('3'), 0)  # общий bucket исчерпан
+
+        limiter.block('4', 30)
+        self.assertGreater(limiter.reserve('4'), 29)
+        limiter.block(None, 5)  # блокировка всего бота
+        self.assertGreater(limiter.reserve('5'), 4)
+
+    @override_settings(TELEGRAM_RATE_LIMIT_MAX_WAIT=0.5)
+    def test_acquire_waits_for_short_delay(self):
+        """Тест: короткая пауза выжидается, длинная возвращается вызывающему"""
+        with override_settings(TELEGRAM_RATE_LIMIT_CHAT_RATE=4):
+            ratelimit.reset_rate_limiter()
+            self.assertEqual(ratelimit.acquire('1'), 0)
+            self.assertEqual(ratelimit.acquire('1'), 0)  # ~0.25 с ожидания внутри лимита
+
+        with override_settings(TELEGRAM_RATE_LIMIT_CHAT_RATE=0.1):
+            ratelimit.reset_rate_limiter()
+            self.assertEqual(ratelimit.acquire('1'), 0)
+            self.assertGreater(ratelimit.acquire('1'), 0.5)
+
+    def test_429_honours_retry_after(self):
+        """Тест: 429 возвращает retry_after из ответа и блокирует чат"""
+        server = self.start_server(responses=[
+            (429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 7}}),
+        ])
+
+        result = telegram.send_message('555', "Сообщение")
+        self.assertFalse(result)
+        self.assertEqual(result.retry_after, 7)
+
+        # Пока действует retry_after, запрос в Telegram не уходит
+        result = telegram.send_message('555', "Сообщение")
+        self.assertGreater(result.retry_after, 6)
+        self.assertEqual(len(server.messages), 1)
+
+    @patch('bot.tasks.send_reminder_deliveries.apply_async')
+    def test_reminder_rescheduled_on_429(self, mock_apply_async):
+        """Тест: напоминание не теряется при 429, а переносится на retry_after"""
+        self.start_server(responses=[
+            (429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 30}}),
+        ])
+        user = User.objects.create_user(username='limited', password='testpass123', telegram_chat_id='777')
+        habit = Habit.objects.create(user=user, place="Парк", time="08:00:00", action="Бегать", duration=60)
+        Habit.objects.filter(id=habit.id).update(next_reminder_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(send_habit_reminders([habit.id]), 0)
+
+        habit.refresh_from_db()
+        self.assertIsNone(habit.last_completed)
+        delivery = ReminderDelivery.objects.get(habit=habit)
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_PENDING)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertAlmostEqual(
+            (delivery.available_at - timezone.now()).total_seconds(), 30, delta=5
+        )
+        # Повтор поставлен сразу с задержкой retry_after, а не ждёт сборщика
+        mock_apply_async.assert_called_once_with(([delivery.id],), countdown=30)
+
+
+@override_settings(BOT_REMINDER_BATCH_SIZE=0)
+class SchedulerWindowTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='windowuser',
+            password='testpass123',
+            telegram_chat_id='123456789'
+        )
+        self.habit = Habit.objects.create(
+            user=self.user, place="Парк", time="08:00:00", action="Бегать", duration=60
+        )
+
+    def set_next_reminder(self, habit, minutes_ago):
+        Habit.objects.filter(id=habit.id).update(next_reminder_at=timezone.now() - timedelta(minutes=minutes_ago))
+
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_overlapping_runs_do_not_resend(self, mock_delay):
+        """Тест: следующий запуск не ставит повторно то, что уже попало в прошлое окно"""
+        self.set_next_reminder(self.habit, 1)
+
+        self.assertEqual(check_due_habits(), 1)
+        # Задача отправки ещё не выполнилась, next_reminder_at не сдвинут
+        self.assertEqual(check_due_habits(), 0)
+        self.assertEqual(dispatched_habit_ids(mock_delay), [self.habit.id])
+
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_catch_up_after_outage(self, mock_delay):
+        """Тест: после простоя обрабатывается всё окно с момента последнего запуска"""
+        SchedulerState.objects.create(name='check_due_habits', watermark=timezone.now() - timedelta(minutes=30))
+        missed = Habit.objects.create(user=self.user, place="Дом", time="09:00:00", action="Читать", duration=60)
+        old = Habit.objects.create(user=self.user, place="Дом", time="10:00:00", action="Отжиматься", duration=60)
+        self.set_next_reminder(self.habit, 1)
+        self.set_next_reminder(missed, 20)
+        self.set_next_reminder(old, 45)  # до watermark - уже было поставлено в очередь
+
+        self.assertEqual(check_due_habits(), 2)
+        self.assertCountEqual(dispatched_habit_ids(mock_delay), [self.habit.id, missed.id])
+
+        state = SchedulerState.objects.get(name='check_due_habits')
+        self.assertGreater(state.watermark, timezone.now() - timedelta(minutes=1))
+
+    def test_edit_does_not_move_pending_reminder(self):
+        """Тест: правка не влияющих на расписание полей не сдвигает напоминание"""
+        self.set_next_reminder(self.habit, 1)
+        self.habit.refresh_from_db()
+        pending = self.habit.next_reminder_at
+
+        self.habit.place = "Стадион"
+        self.habit.save()
+        self.assertEqual(self.habit.next_reminder_at, pending)
+
+        self.habit.periodicity = 3
+        self.habit.save()
+        self.assertGreater(self.habit.next_reminder_at, timezone.now())
+
+
+class UserTimezoneSchedulingTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='tzuser',
+            password='testpass123',
+            telegram_chat_id='123456789',
+            timezone='Asia/Vladivostok'
+        )
+        self.habit = Habit.objects.create(
+            user=self.user, place="Парк", time="08:00:00", action="Бегать", duration=60
+        )
+
+    def test_next_reminder_in_user_timezone(self):
+        """Тест: время привычки трактуется в часовом поясе пользователя"""
+        now = datetime(2025, 1, 10, 12, 0, tzinfo=dt_timezone.utc)  # 22:00 во Владивостоке
+
+        self.assertEqual(self.habit.calculate_next_reminder(now), datetime(2025, 1, 10, 22, 0, tzinfo=dt_timezone.utc))
+
+    def test_timezone_change_reschedules_habits(self):
+        """Тест: смена часового пояса пересчитывает next_reminder_at привычек"""
+        self.user.timezone = 'Europe/London'
+        self.user.save()
+
+        self.habit.refresh_from_db()
+        local = self.habit.next_reminder_at.astimezone(self.user.zoneinfo)
+        self.assertEqual(local.time(), time(8, 0))
+
+
+@override_settings(BOT_REMINDER_BATCH_SIZE=3)
+class ShardedSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='sharduser',
+            password='testpass123',
+            telegram_chat_id='123456789'
+        )
+        Habit.objects.bulk_create([
+            Habit(user=self.user, place="Парк", time="08:00:00", action=f"Действие {i}", duration=60,
+                  next_reminder_at=timezone.now() - timedelta(minutes=i % 40))
+            for i in range(50)
+        ])
+        self.window = (timezone.now() - timedelta(minutes=30), timezone.now())
+
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_shards_cover_same_habits_as_single_scan(self, mock_delay):
+        """Тест: объединение шардов совпадает с одиночным сканированием, без пересечений"""
+        self.assertEqual(dispatch_due_habits(*self.window), 40)
+        single = dispatched_habit_ids(mock_delay)
+
+        for shards in (2, 3, 7):
+            mock_delay.reset_mock()
+            total = sum(dispatch_due_habits(*self.window, shard, shards) for shard in range(shards))
+            sharded = dispatched_habit_ids(mock_delay)
+
+            self.assertEqual(total, len(single))
+            self.assertEqual(len(sharded), len(set(sharded)))
+            self.assertCountEqual(sharded, single)
+
+    @override_settings(BOT_SCHEDULER_SHARDS=4)
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_chord_collects_sent_count(self, mock_delay):
+        """Тест: chord шардов возвращает общее количество напоминаний"""
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', False)
+
+        with patch.object(sum_sent_counts, 'run', wraps=sum_sent_counts.run) as mock_sum:
+            self.assertIsNone(check_due_habits())
+
+        mock_sum.assert_called_once()
+        self.assertEqual(sum(mock_sum.call_args.args[0]), 50)
+        self.assertEqual(len(mock_sum.call_args.args[0]), 4)
+        self.assertEqual(len(dispatched_habit_ids(mock_delay)), 50)
+
+
+class ReminderOutboxTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='outboxuser',
+            password='testpass123',
+            telegram_chat_id='123456789'
+        )
+        self.habit = Habit.objects.create(
+            user=self.user, place="Парк", time="08:00:00", action="Бегать", duration=60
+        )
+        self.slot = timezone.now() - timedelta(minutes=1)
+        Habit.objects.filter(id=self.habit.id).update(next_reminder_at=self.slot)
+
+    def test_enqueue_is_idempotent(self):
+        """Тест: повторная запись того же времени напоминания не создаёт дубль"""
+        now = timezone.now()
+        first = enqueue_deliveries([(self.habit.id, self.slot)], now)
+        second = enqueue_deliveries([(self.habit.id, self.slot)], now)
+
+        self.assertEqual(first, second)
+        self.assertEqual(ReminderDelivery.objects.count(), 1)
+
+    @patch('bot.tasks.send_telegram_message', return_value=True)
+    def test_claimed_delivery_is_not_sent_twice(self, mock_send):
+        """Тест: запись, уже взятая другим воркером, не отправляется повторно"""
+        delivery_ids = enqueue_deliveries([(self.habit.id, self.slot)], timezone.now())
+        ReminderDelivery.objects.filter(id__in=delivery_ids).update(status=ReminderDelivery.STATUS_SENDING)
+
+        self.assertEqual(send_reminder_deliveries(delivery_ids), 0)
+        mock_send.assert_not_called()
+
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    @patch('bot.tasks.send_telegram_message', return_value=telegram.SendResult(False, error='Bad Gateway'))
+    def test_failed_delivery_retried_by_sweeper(self, mock_send, mock_delay):
+        """Тест: неудачная отправка сохраняется с ошибкой и повторяется сборщиком"""
+        delivery_ids = enqueue_deliveries([(self.habit.id, self.slot)], timezone.now())
+        self.assertEqual(send_reminder_deliveries(delivery_ids), 0)
+
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.last_error, 'Bad Gateway')
+
+        # До истечения паузы запись не берётся, после - возвращается в очередь
+        self.assertEqual(retry_reminder_deliveries(), 0)
+        ReminderDelivery.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(retry_reminder_deliveries(), 1)
+        self.assertEqual(dispatched_habit_ids(mock_delay), [self.habit.id])
+        self.assertEqual(ReminderDelivery.objects.get().status, ReminderDelivery.STATUS_PENDING)
+
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    @patch('bot.tasks.send_telegram_message', return_value=telegram.SendResult(False, error='Bad Gateway'))
+    def test_retry_success_keeps_next_slot(self, mock_send, mock_delay):
+        """Тест: успешный повтор после ошибки не пропускает следующее напоминание"""
+        slot = (timezone.now() - timedelta(minutes=2)).astimezone(self.user.zoneinfo).replace(second=0, microsecond=0)
+        Habit.objects.filter(id=self.habit.id).update(time=slot.time(), next_reminder_at=slot)
+        next_slot = slot + timedelta(days=1)
+
+        delivery_ids = enqueue_deliveries([(self.habit.id, slot)], timezone.now())
+        self.assertEqual(send_reminder_deliveries(delivery_ids), 0)
+        self.assertEqual(Habit.objects.get(id=self.habit.id).next_reminder_at, next_slot)
+
+        ReminderDelivery.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(retry_reminder_deliveries(), 1)
+        mock_send.return_value = telegram.SendResult(True)
+        self.assertEqual(send_reminder_deliveries(delivery_ids), 1)
+        self.assertEqual(Habit.objects.get(id=self.habit.id).next_reminder_at, next_slot)
+
+    @patch('bot.tasks.send_reminder_deliveries.delay')
+    def test_stuck_sending_retried_until_max_attempts(self, mock_delay):
+        """Тест: зависшая отправка повторяется сборщиком не больше BOT_DELIVERY_MAX_ATTEMPTS раз"""
+        enqueue_deliveries([(self.habit.id, self.slot)], timezone.now())
+        stuck_since = timezone.now() - timedelta(seconds=settings.BOT_DELIVERY_SENDING_TIMEOUT + 1)
+
+        ReminderDelivery.objects.update(status=ReminderDelivery.STATUS_SENDING, attempts=1, updated_at=stuck_since)
+        self.assertEqual(retry_reminder_deliveries(), 1)
+
+        ReminderDelivery.objects.update(
+            status=ReminderDelivery.STATUS_SENDING, attempts=settings.BOT_DELIVERY_MAX_ATTEMPTS, updated_at=stuck_since
+        )
+        self.assertEqual(retry_reminder_deliveries(), 0)
+        self.assertEqual(ReminderDelivery.objects.get().status, ReminderDelivery.STATUS_SENDING)
+
+    @patch('bot.tasks.send_telegram_message', return_value=telegram.SendResult(True))
+    def test_sent_delivery_changes_owner_habits_version(self, mock_send):
+        """Тест: bulk_update после отправки меняет версию привычек владельца (ETag)"""
+        version = get_user_habits_version(self.user.pk)
+        send_reminder_deliveries(enqueue_deliveries([(self.habit.id, self.slot)], timezone.now()))
+
+        self.assertNotEqual(get_user_habits_version(self.user.pk), version)
+
+    @override_settings(BOT_DELIVERY_MAX_ATTEMPTS=1)
+    @patch('bot.tasks.send_telegram_message', return_value=False)
+    def test_exhausted_delivery_not_retried(self, mock_send):
+        """Тест: после исчерпания попыток запись остаётся failed"""
+        delivery_ids = enqueue_deliveries([(self.habit.id, self.slot)], timezone.now())
+        send_reminder_deliveries(delivery_ids)
+        ReminderDelivery.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(retry_reminder_deliveries(), 0)
+
+
+class SimulateReminderLoadCommandTest(TestCase):
+
+    def test_report(self):
+        """Тест: симуляция отправляет напоминания в заглушку и не оставляет данных"""
+        out = StringIO()
+        call_command('simulate_reminder_load', users=30, latency=0, batch_size=10, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertGreater(report['due_reminders'], 0)
+        self.assertEqual(report['messages_sent'], report['due_reminders'])
+        self.assertEqual(report['stub_messages'], report['messages_sent'])
+        self.assertLessEqual(report['send_tasks'], report['due_reminders'] // 10 + 1)
+        self.assertIsNotNone(report['send_latency_ms']['p99'])
+        self.assertFalse(User.objects.filter(username__startswith='loadsim_').exists())
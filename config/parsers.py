@@ -0,0 +1,41 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - без orjson работает стандартный json
+    orjson = None
+
+
+def loads(content):
+    """Разбор JSON из bytes или str: orjson, если установлен; NaN и Infinity отклоняются"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content, parse_constant=_reject_constant)
+
+
+def _reject_constant(value):
+    raise ValueError(f'Недопустимое значение JSON: {value}')
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser на orjson, если он установлен; NaN и Infinity отклоняются, как в strict-режиме DRF"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None or not api_settings.STRICT_JSON:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if codecs.lookup(encoding).name != 'utf-8':
+                content = content.decode(encoding)
+            return orjson.loads(content)
+        except (orjson.JSONDecodeError, UnicodeDecodeError, LookupError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
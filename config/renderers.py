@@ -0,0 +1,50 @@
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - без orjson работает стандартный json
+    orjson = None
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен; иначе - стандартный рендерер DRF.
+    Вывод побайтно совпадает с JSONRenderer: компактные разделители, UTF-8, экранирование
+    U+2028/U+2029, а даты и время форматируются тем же JSONEncoder DRF (миллисекунды, 'Z').
+    """
+    # Даты и время отдаются в default: их формат у orjson отличается от формата DRF
+    orjson_options = (
+        (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or not self.is_compact(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(data, default=self.default, option=self.orjson_options)
+        except (orjson.JSONEncodeError, ValueError):
+            # Числа вне int64 и прочие редкие случаи - как у стандартного рендерера
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def is_compact(self, accepted_media_type, renderer_context):
+        """Путь orjson - только для компактного UTF-8 вывода без отступов"""
+        return (
+            self.ensure_ascii is False
+            and self.compact
+            and api_settings.STRICT_JSON
+            and self.encoder_class is encoders.JSONEncoder
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    @staticmethod
+    def default(obj):
+        return _drf_encoder.default(obj)
+
+
+_drf_encoder = encoders.JSONEncoder()
@@ -81,7 +81,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-if 'test' in sys.argv or os.getenv('GITHUB_ACTIONS') == 'true':
+TESTING = 'test' in sys.argv or os.getenv('GITHUB_ACTIONS') == 'true'
+
+if TESTING:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -169,15 +171,38 @@ AUTH_USER_MODEL = 'users.User'
 # DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 5
+    'PAGE_SIZE': 5,
+    # orjson, если установлен; иначе стандартный json
+    'DEFAULT_RENDERER_CLASSES': [
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'config.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Кэш пользователей для JWT-аутентификации (в памяти процесса)
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # секунд; изменения в других процессах видны не позже
+
+# Максимум операций в одном запросе /api/habits/bulk/
+HABITS_BULK_MAX_OPERATIONS = int(os.getenv('HABITS_BULK_MAX_OPERATIONS', 100))
+
+# Строк за одну выборку и в одном куске ответа потоковой выгрузки /api/habits/export/
+HABITS_EXPORT_CHUNK_SIZE = int(os.getenv('HABITS_EXPORT_CHUNK_SIZE', 2000))
+
+# Строк в одной пачке проверки и bulk_create потокового импорта /api/habits/import/
+HABITS_IMPORT_CHUNK_SIZE = int(os.getenv('HABITS_IMPORT_CHUNK_SIZE', 1000))
+
 # CORS
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # Адрес вашего фронтенда
@@ -188,5 +213,70 @@ CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')  # 'r
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
 CELERY_TIMEZONE = TIME_ZONE
 
+# Буфер выполнений привычек: redis - общий для всех процессов, memory - только для тестов и одного процесса
+HABITS_COMPLETION_BUFFER_BACKEND = os.getenv('HABITS_COMPLETION_BUFFER_BACKEND', 'memory' if TESTING else 'redis')
+HABITS_COMPLETION_BUFFER_REDIS_URL = os.getenv('HABITS_COMPLETION_BUFFER_REDIS_URL', CELERY_BROKER_URL)
+# Записей в одном bulk_create; столько же в буфере - сброс сразу, не дожидаясь задачи
+HABITS_COMPLETION_FLUSH_SIZE = int(os.getenv('HABITS_COMPLETION_FLUSH_SIZE', 500))
+
+# Кэш: Redis в окружении, локальная память в тестах
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://redis:6379/1'),
+        }
+    }
+# Время жизни страницы публичной ленты; правки публичных привычек сбрасывают кэш сразу
+PUBLIC_FEED_CACHE_TIMEOUT = int(os.getenv('PUBLIC_FEED_CACHE_TIMEOUT', 60))
+
 # Telegram
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_HTTP_POOL_SIZE = int(os.getenv('TELEGRAM_HTTP_POOL_SIZE', 10))
+TELEGRAM_HTTP_CONNECT_TIMEOUT = float(os.getenv('TELEGRAM_HTTP_CONNECT_TIMEOUT', 3.05))
+TELEGRAM_HTTP_READ_TIMEOUT = float(os.getenv('TELEGRAM_HTTP_READ_TIMEOUT', 10))
+TELEGRAM_DELIVERY_CONCURRENCY = int(os.getenv('TELEGRAM_DELIVERY_CONCURRENCY', 10))
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и ~1 в секунду на чат
+TELEGRAM_RATE_LIMIT_BACKEND = os.getenv('TELEGRAM_RATE_LIMIT_BACKEND', 'memory' if TESTING else 'redis')  # redis | memory
+TELEGRAM_RATE_LIMIT_REDIS_URL = os.getenv('TELEGRAM_RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
+TELEGRAM_RATE_LIMIT_GLOBAL_RATE = float(os.getenv('TELEGRAM_RATE_LIMIT_GLOBAL_RATE', 30))
+TELEGRAM_RATE_LIMIT_GLOBAL_BURST = float(os.getenv('TELEGRAM_RATE_LIMIT_GLOBAL_BURST', 30))
+TELEGRAM_RATE_LIMIT_CHAT_RATE = float(os.getenv('TELEGRAM_RATE_LIMIT_CHAT_RATE', 1))
+TELEGRAM_RATE_LIMIT_CHAT_BURST = float(os.getenv('TELEGRAM_RATE_LIMIT_CHAT_BURST', 1))
+TELEGRAM_RATE_LIMIT_MAX_WAIT = float(os.getenv('TELEGRAM_RATE_LIMIT_MAX_WAIT', 1))  # дольше - переносим отправку
+TELEGRAM_RATE_LIMIT_DEFAULT_RETRY_AFTER = int(os.getenv('TELEGRAM_RATE_LIMIT_DEFAULT_RETRY_AFTER', 5))
+
+# Напоминания: сколько привычек обрабатывает одна задача (0 - по задаче на привычку)
+BOT_REMINDER_BATCH_SIZE = int(os.getenv('BOT_REMINDER_BATCH_SIZE', 100))
+# Количество параллельных задач-шардов, сканирующих окно check_due_habits (1 - без шардирования)
+BOT_SCHEDULER_SHARDS = int(os.getenv('BOT_SCHEDULER_SHARDS', 1))
+
+# Outbox напоминаний: повторы неудачных отправок
+BOT_DELIVERY_MAX_ATTEMPTS = int(os.getenv('BOT_DELIVERY_MAX_ATTEMPTS', 3))
+BOT_DELIVERY_RETRY_DELAY = int(os.getenv('BOT_DELIVERY_RETRY_DELAY', 60))  # секунд, удваивается с каждой попыткой
+BOT_DELIVERY_RETRY_BATCH = int(os.getenv('BOT_DELIVERY_RETRY_BATCH', 1000))
+BOT_DELIVERY_PENDING_TIMEOUT = int(os.getenv('BOT_DELIVERY_PENDING_TIMEOUT', 120))  # не взята воркером
+BOT_DELIVERY_SENDING_TIMEOUT = int(os.getenv('BOT_DELIVERY_SENDING_TIMEOUT', 600))  # воркер упал во время отправки
+
+CELERY_BEAT_SCHEDULE = {
+    'check-due-habits': {
+        'task': 'bot.tasks.check_due_habits',
+        'schedule': int(os.getenv('BOT_SCHEDULER_INTERVAL', 60)),
+    },
+    'retry-reminder-deliveries': {
+        'task': 'bot.tasks.retry_reminder_deliveries',
+        'schedule': int(os.getenv('BOT_DELIVERY_RETRY_INTERVAL', 300)),
+    },
+    'flush-habit-completions': {
+        'task': 'habits.tasks.flush_habit_completions',
+        'schedule': int(os.getenv('HABITS_COMPLETION_FLUSH_INTERVAL', 5)),
+    },
+}
@@ -7,7 +7,7 @@ class HabitAdmin(admin.ModelAdmin):
     list_display = ('action', 'user', 'time', 'place', 'is_pleasant', 'is_public', 'created_at')
     list_filter = ('is_pleasant', 'is_public', 'periodicity', 'created_at')
     search_fields = ('action', 'place', 'user__username')
-    readonly_fields = ('created_at', 'last_completed')
+    readonly_fields = ('created_at', 'last_completed', 'next_reminder_at')
 
     fieldsets = (
         ('Основная информация', {
@@ -17,6 +17,10 @@ class HabitAdmin(admin.ModelAdmin):
             'fields': ('is_pleasant', 'related_habit', 'periodicity', 'reward', 'duration')
         }),
         ('Дополнительно', {
-            'fields': ('is_public', 'created_at', 'last_completed')
+            'fields': ('is_public', 'created_at', 'last_completed', 'next_reminder_at')
         }),
     )
+
+    def get_queryset(self, request):
+        # Пользователь и связанная привычка выводятся в списке - загружаются одним запросом
+        return super().get_queryset(request).select_related('user', 'related_habit')
@@ -0,0 +1,134 @@
+from django.db import transaction
+from rest_framework.settings import api_settings
+
+from .cache import bump_public_feed_version, bump_user_habits_version
+from .models import Habit
+from .serializers import BulkOperationSerializer, HabitBulkItemSerializer, habit_values_serializer
+from .validators import resolve_related_habits, validate_habits
+
+NOT_FOUND_MESSAGE = 'Привычка не найдена.'
+DUPLICATE_MESSAGE = 'Привычка уже изменяется другой операцией этого запроса.'
+
+
+def apply_bulk_operations(user, operations):
+    """
+    Создание, изменение и удаление привычек пользователя одним запросом.
+
+    Все операции проверяются вместе: связанные и изменяемые привычки читаются двумя запросами
+    на весь пакет. При любой ошибке ничего не применяется. Возвращает (успех, результаты по операциям).
+    """
+    parsed = [BulkOperationSerializer(data=operation) for operation in operations]
+    errors = {index: item.errors for index, item in enumerate(parsed) if not item.is_valid()}
+    parsed = [item.validated_data if index not in errors else None for index, item in enumerate(parsed)]
+
+    # Изменяемые привычки пользователя - одним запросом, вместе со связанными
+    target_ids = {item['id'] for item in parsed if item and item['op'] != 'create'}
+    existing = {
+        habit.id: habit
+        for habit in Habit.objects.owned_by(user).filter(id__in=target_ids)
+    } if target_ids else {}
+    for habit in existing.values():
+        habit.user = user  # для часового пояса при пересчёте напоминания - без запроса на привычку
+
+    # Все упомянутые related_habit - тоже одним запросом; изменяемые в пакете берутся из existing
+    related_ids = {
+        as_pk(item['data'].get('related_habit')) for item in parsed if item and item['op'] != 'delete'
+    } - {None}
+    related = resolve_related_habits(related_ids, known=existing)
+
+    to_create, to_update, to_delete = [], [], []
+    update_fields = set()
+    seen = set()
+    planned = []
+    public_changed = False
+    for index, item in enumerate(parsed):
+        if item is None:
+            continue
+        op = item['op']
+        instance = None
+        if op != 'create':
+            instance = existing.get(item['id'])
+            if instance is None:
+                errors[index] = {'id': [NOT_FOUND_MESSAGE]}
+                continue
+            if instance.id in seen:
+                errors[index] = {'id': [DUPLICATE_MESSAGE]}
+                continue
+            seen.add(instance.id)
+
+        if op == 'delete':
+            to_delete.append(instance)
+            planned.append((index, op, instance))
+            continue
+
+        serializer = HabitBulkItemSerializer(
+            instance, data=item['data'], partial=op == 'update', context={'related_habits': related}
+        )
+        if not serializer.is_valid():
+            errors[index] = serializer.errors
+            continue
+
+        habit = instance or Habit(user=user)
+        public_changed = public_changed or habit.is_public
+        for field, value in serializer.validated_data.items():
+            setattr(habit, field, value)
+        public_changed = public_changed or habit.is_public
+        if op == 'create':
+            to_create.append(habit)
+        else:
+            update_fields.update(serializer.validated_data)
+            to_update.append(habit)
+        planned.append((index, op, habit))
+
+    # Правила - за один проход по итоговому состоянию всех привычек пакета
+    changed = [(index, habit) for index, op, habit in planned if op != 'delete']
+    for position, message in validate_habits([habit for _, habit in changed]).items():
+        errors[changed[position][0]] = {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+    if errors:
+        return False, [
+            {'index': index, 'ok': False, 'errors': errors[index]} if index in errors else {'index': index, 'ok': True}
+            for index in range(len(operations))
+        ]
+
+    for habit in to_create:
+        habit.next_reminder_at = habit.calculate_next_reminder()
+    for habit in to_update:
+        if habit._schedule_changed():
+            habit.next_reminder_at = habit.calculate_next_reminder()
+            update_fields.add('next_reminder_at')
+
+    with transaction.atomic():
+        if to_create:
+            Habit.objects.bulk_create(to_create)
+        if to_update and update_fields:
+            Habit.objects.bulk_update(to_update, sorted(update_fields))
+        if to_delete:
+            Habit.objects.filter(id__in=[habit.id for habit in to_delete]).delete()
+
+    # bulk_create/bulk_update не шлют сигналов - кэши сбрасываются явно
+    bump_user_habits_version(user.pk)
+    # Изменённая приятная привычка могла быть раскрыта в публичной ленте как связанная
+    linked = [habit.id for habit in to_update if habit.may_be_linked()]
+    if public_changed or (linked and Habit.objects.public().linking_to(linked).exists()):
+        bump_public_feed_version()
+
+    results = []
+    for index, op, habit in planned:
+        result = {'index': index, 'ok': True, 'op': op, 'id': habit.id}
+        if op != 'delete':
+            habit._loaded_schedule = habit._schedule_state()
+            habit._loaded_is_public = habit.is_public
+            habit._loaded_is_pleasant = habit.is_pleasant
+            result['data'] = habit_values_serializer.to_representation(habit)
+        results.append(result)
+    return True, results
+
+
+def as_pk(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
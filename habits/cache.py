@@ -0,0 +1,91 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Версия ленты входит в ключ каждой страницы: смена версии разом "забывает" все закэшированные страницы
+PUBLIC_FEED_VERSION_KEY = 'habits:public_feed:version'
+PUBLIC_FEED_HITS_KEY = 'habits:public_feed:hits'
+PUBLIC_FEED_MISSES_KEY = 'habits:public_feed:misses'
+# Версия привычек пользователя - случайный токен: новое значение не совпадёт ни с одним выданным ETag
+USER_HABITS_VERSION_KEY = 'habits:user:{user_id}:version'
+
+
+def get_public_feed_version():
+    """Текущая версия публичной ленты"""
+    version = cache.get(PUBLIC_FEED_VERSION_KEY)
+    if version is None:
+        # Начальная версия от времени: после вытеснения ключа версии старые страницы не оживут
+        cache.add(PUBLIC_FEED_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(PUBLIC_FEED_VERSION_KEY)
+    return version
+
+
+def bump_public_feed_version():
+    """Инвалидация всех закэшированных страниц публичной ленты"""
+    try:
+        return cache.incr(PUBLIC_FEED_VERSION_KEY)
+    except ValueError:
+        return get_public_feed_version()
+
+
+def public_feed_key(request):
+    """Ключ страницы ленты: версия + хост (в ссылках next/previous) + нормализованные параметры запроса"""
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    raw = f"{request.get_host()}?{params}"
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f"habits:public_feed:v{get_public_feed_version()}:{digest}"
+
+
+def get_public_feed_page(request):
+    """JSON закэшированной страницы ленты или None"""
+    content = cache.get(public_feed_key(request))
+    _count(PUBLIC_FEED_HITS_KEY if content is not None else PUBLIC_FEED_MISSES_KEY)
+    return content
+
+
+def set_public_feed_page(request, content):
+    cache.set(public_feed_key(request), content, timeout=settings.PUBLIC_FEED_CACHE_TIMEOUT)
+
+
+def get_public_feed_stats():
+    """Счётчики попаданий и промахов кэша публичной ленты"""
+    hits = cache.get(PUBLIC_FEED_HITS_KEY, 0)
+    misses = cache.get(PUBLIC_FEED_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_public_feed_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def get_user_habits_version(user_id):
+    """Текущая версия привычек пользователя (создаётся при первом обращении)"""
+    key = USER_HABITS_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_habits_version(*user_ids):
+    """Новая версия привычек пользователей: ранее выданные ETag перестают совпадать"""
+    if user_ids:
+        cache.set_many(
+            {USER_HABITS_VERSION_KEY.format(user_id=user_id): uuid.uuid4().hex for user_id in set(user_ids)},
+            timeout=None,
+        )
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчика ещё нет: add не затрёт значение, созданное параллельным запросом
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+from datetime import datetime
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_public_feed_version, bump_user_habits_version
+from .models import Habit, HabitCompletion
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCompletionBuffer:
+    """Буфер выполнений в памяти процесса: для тестов и одного процесса"""
+
+    def __init__(self):
+        self._items = []
+        self._lock = threading.Lock()
+
+    def push(self, item):
+        """Добавить запись; вернуть размер буфера"""
+        with self._lock:
+            self._items.append(item)
+            return len(self._items)
+
+    def pop(self, count):
+        """Забрать до count самых старых записей"""
+        with self._lock:
+            items, self._items = self._items[:count], self._items[count:]
+            return items
+
+    def size(self):
+        with self._lock:
+            return len(self._items)
+
+
+class RedisCompletionBuffer:
+    """Буфер выполнений в списке Redis, общий для всех процессов API и воркеров Celery"""
+
+    def __init__(self, url, key='habits:completions:buffer'):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def push(self, item):
+        return self.client.rpush(self.key, json.dumps(item))
+
+    def pop(self, count):
+        # Чтение и обрезка в одной транзакции MULTI: запись достаётся ровно одному flush
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrange(self.key, 0, count - 1)
+            pipe.ltrim(self.key, count, -1)
+            raw, _ = pipe.execute()
+        return [json.loads(value) for value in raw]
+
+    def size(self):
+        return self.client.llen(self.key)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_completion_buffer():
+    """Буфер выполнений процесса, выбранный через HABITS_COMPLETION_BUFFER_BACKEND"""
+    global _buffer
+
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if settings.HABITS_COMPLETION_BUFFER_BACKEND == 'redis':
+                    _buffer = RedisCompletionBuffer(settings.HABITS_COMPLETION_BUFFER_REDIS_URL)
+                else:
+                    _buffer = MemoryCompletionBuffer()
+    return _buffer
+
+
+def reset_completion_buffer():
+    """Сброс буфера (после изменения настроек и в тестах)"""
+    global _buffer
+
+    with _buffer_lock:
+        _buffer = None
+
+
+def record_completion(habit, completed_at):
+    """
+    Запись выполнения в буфер без транзакции в БД. Буфер сбрасывается в таблицу задачей
+    flush_habit_completions или сразу, когда в нём набралось HABITS_COMPLETION_FLUSH_SIZE записей.
+    """
+    size = get_completion_buffer().push({
+        'habit_id': habit.id,
+        'user_id': habit.user_id,
+        'completed_at': completed_at.isoformat(),
+    })
+    if size >= settings.HABITS_COMPLETION_FLUSH_SIZE:
+        # Одна пачка в запросе, который её набрал; ошибка не теряет выполнение - оно вернулось в буфер
+        try:
+            flush_completions(limit=settings.HABITS_COMPLETION_FLUSH_SIZE)
+        except Exception:
+            logger.exception("Ошибка записи пачки выполнений привычек, повтор при следующем сбросе")
+
+
+def flush_completions(limit=None):
+    """
+    Перенос выполнений из буфера в HabitCompletion пачками по HABITS_COMPLETION_FLUSH_SIZE:
+    на пачку - один запрос привычек, один bulk_create и один bulk_update last_completed.
+    Возвращает количество записанных выполнений.
+    """
+    buffer = get_completion_buffer()
+    batch_size = settings.HABITS_COMPLETION_FLUSH_SIZE
+    written = 0
+    while limit is None or written < limit:
+        items = buffer.pop(batch_size)
+        if not items:
+            break
+        try:
+            written += _write_completions(items)
+        except Exception:
+            # Пачка возвращается в буфер и будет записана следующим flush
+            for item in items:
+                buffer.push(item)
+            raise
+        if len(items) < batch_size:
+            break
+    return written
+
+
+def _write_completions(items):
+    # Привычки, удалённые до сброса буфера, пропускаются
+    habits = Habit.objects.select_related('user').in_bulk({item['habit_id'] for item in items})
+    completions = []
+    for item in items:
+        habit = habits.get(item['habit_id'])
+        if habit is None:
+            continue
+        completed_at = datetime.fromisoformat(item['completed_at'])
+        completions.append(HabitCompletion(habit=habit, user_id=item['user_id'], completed_at=completed_at))
+
+    # Последнее выполнение переносит напоминание: выполненная привычка не напоминается до следующего раза
+    changed = {}
+    for completion in completions:
+        habit = completion.habit
+        if habit.last_completed is None or completion.completed_at > habit.last_completed:
+            habit.last_completed = completion.completed_at
+            changed[habit.id] = habit
+    for habit in changed.values():
+        habit.next_reminder_at = habit.calculate_next_reminder()
+
+    with transaction.atomic():
+        HabitCompletion.objects.bulk_create(completions)
+        if changed:
+            Habit.objects.bulk_update(changed.values(), ['last_completed', 'next_reminder_at'])
+
+    # bulk_create/bulk_update не шлют сигналов - кэши сбрасываются явно
+    if changed:
+        bump_user_habits_version(*{habit.user_id for habit in changed.values()})
+        linked = [habit.id for habit in changed.values() if habit.may_be_linked()]
+        if any(habit.is_public for habit in changed.values()) or (
+            linked and Habit.objects.public().linking_to(linked).exists()
+        ):
+            bump_public_feed_version()
+    logger.info(f"Записано выполнений привычек: {len(completions)}, пропущено: {len(items) - len(completions)}")
+    return len(completions)
@@ -0,0 +1,68 @@
+import csv
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from config.renderers import FastJSONRenderer
+from .serializers import habit_values_serializer
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=None):
+    """
+    Привычки выборки в представлении API, строка за строкой: .values() и .iterator(chunk_size),
+    без кэша результатов queryset - в памяти не больше одной пачки строк
+    """
+    chunk_size = chunk_size or settings.HABITS_EXPORT_CHUNK_SIZE
+    rows = queryset.values(*habit_values_serializer.columns).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield habit_values_serializer.to_representation(row)
+
+
+def ndjson_lines(rows):
+    """Одна привычка - одна строка JSON, те же байты, что и в ответах API"""
+    renderer = FastJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b'\n'
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    columns = [name for name, _, _ in habit_values_serializer.compiled]
+    yield writer.writerow(columns).encode('utf-8')
+    for row in rows:
+        yield writer.writerow([row[name] for name in columns]).encode('utf-8')
+
+
+def batched(lines, size):
+    """Склейка строк в куски по size штук: меньше записей в сокет на большой выгрузке"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield b''.join(batch)
+            batch = []
+    if batch:
+        yield b''.join(batch)
+
+
+def export_response(queryset, export_format, filename='habits', chunk_size=None):
+    """StreamingHttpResponse с выгрузкой queryset в NDJSON или CSV"""
+    chunk_size = chunk_size or settings.HABITS_EXPORT_CHUNK_SIZE
+    content_type, extension = EXPORT_FORMATS[export_format]
+    rows = export_rows(queryset, chunk_size)
+    lines = ndjson_lines(rows) if export_format == 'ndjson' else csv_lines(rows)
+    response = StreamingHttpResponse(batched(lines, chunk_size), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -0,0 +1,140 @@
+import csv
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from config.parsers import loads
+from config.renderers import FastJSONRenderer
+from .bulk import as_pk
+from .cache import bump_public_feed_version, bump_user_habits_version
+from .models import Habit
+from .serializers import HabitBulkItemSerializer
+from .validators import resolve_related_habits, validate_habits
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+INVALID_JSON_MESSAGE = 'Строка не является JSON-объектом.'
+INVALID_ENCODING_MESSAGE = 'Строка не в кодировке UTF-8.'
+
+
+def ndjson_records(lines):
+    """(номер строки, запись или сообщение об ошибке) для каждой непустой строки NDJSON"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else INVALID_JSON_MESSAGE
+
+
+def csv_records(lines):
+    """
+    Строки CSV с заголовком в записи. Пустые ячейки опускаются: поле получает значение
+    по умолчанию, как в выгрузке /api/habits/export/?export_format=csv
+    """
+    undecodable = []
+    reader = csv.DictReader(_decode_lines(lines, undecodable))
+    for record in reader:
+        # Нераскодированные строки читатель видит пустыми; ошибки по ним - до следующей записи
+        while undecodable:
+            yield undecodable.pop(0), INVALID_ENCODING_MESSAGE
+        yield reader.line_num, {
+            name: value for name, value in record.items() if name is not None and value not in ('', None)
+        }
+    for number in undecodable:
+        yield number, INVALID_ENCODING_MESSAGE
+
+
+def _decode_lines(lines, undecodable):
+    # Построчно, а не codecs.iterdecode: ошибка кодировки становится ошибкой строки, а не обрывом ответа
+    for number, line in enumerate(lines, start=1):
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            undecodable.append(number)
+            yield '\n'
+
+
+def read_records(lines, import_format):
+    return csv_records(lines) if import_format == 'csv' else ndjson_records(lines)
+
+
+def import_habits(user, records, chunk_size=None):
+    """
+    Импорт привычек пользователя из потока записей пачками по chunk_size.
+
+    В пачке связанные привычки читаются одним запросом, правила проверяются за один проход,
+    а корректные строки вставляются одним bulk_create. Строки с ошибками пропускаются.
+    Отдаёт отчёт по каждой строке по мере обработки: память ограничена одной пачкой.
+    """
+    chunk_size = chunk_size or settings.HABITS_IMPORT_CHUNK_SIZE
+    # Один сериализатор на весь импорт: поля не собираются заново для каждой строки
+    item_serializer = HabitBulkItemSerializer(context={'related_habits': {}})
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield from _import_chunk(user, chunk, item_serializer)
+            chunk = []
+    if chunk:
+        yield from _import_chunk(user, chunk, item_serializer)
+
+
+def count_reports(reports, totals):
+    """Пропускает отчёты по строкам дальше, подсчитывая в totals созданные и отклонённые"""
+    for report in reports:
+        totals['created' if report['ok'] else 'failed'] += 1
+        yield report
+
+
+def import_report_lines(user, records):
+    """NDJSON-отчёт импорта: строка на каждую запись и итог {"summary": ...} последней строкой"""
+    renderer = FastJSONRenderer()
+    totals = {'created': 0, 'failed': 0}
+    for report in count_reports(import_habits(user, records), totals):
+        yield renderer.render(report) + b'\n'
+    yield renderer.render({'summary': totals}) + b'\n'
+
+
+def _import_chunk(user, chunk, item_serializer):
+    reports = {}
+    related_ids = {
+        as_pk(record.get('related_habit')) for _, record in chunk if isinstance(record, dict)
+    } - {None}
+    item_serializer.context['related_habits'] = resolve_related_habits(related_ids)
+
+    planned = []
+    for line, record in chunk:
+        if not isinstance(record, dict):
+            reports[line] = {api_settings.NON_FIELD_ERRORS_KEY: [record]}
+            continue
+        try:
+            validated_data = item_serializer.run_validation(record)
+        except serializers.ValidationError as exc:
+            reports[line] = exc.detail
+            continue
+        planned.append((line, Habit(user=user, **validated_data)))
+
+    for position, message in validate_habits([habit for _, habit in planned]).items():
+        reports[planned[position][0]] = {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+    valid = [habit for line, habit in planned if line not in reports]
+
+    if valid:
+        for habit in valid:
+            habit.next_reminder_at = habit.calculate_next_reminder()
+        with transaction.atomic():
+            Habit.objects.bulk_create(valid)
+        # bulk_create не шлёт сигналов - кэши сбрасываются после каждой пачки
+        bump_user_habits_version(user.pk)
+        if any(habit.is_public for habit in valid):
+            bump_public_feed_version()
+
+    ids = {line: habit.id for line, habit in planned if line not in reports}
+    for line, _ in chunk:
+        if line in reports:
+            yield {'line': line, 'ok': False, 'errors': reports[line]}
+        else:
+            yield {'line': line, 'ok': True, 'id': ids[line]}
@@ -0,0 +1,70 @@
+import json
+import time
+from datetime import time as dt_time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from habits.models import Habit
+from habits.serializers import HabitSerializer, habit_values_serializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Замер сериализации списка привычек: HabitSerializer против быстрого пути по .values()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', default='5,20,100', help='Размеры страниц через запятую')
+        parser.add_argument('--iterations', type=int, default=200, help='Повторов на каждый размер страницы')
+        parser.add_argument('--keep', action='store_true', help='Не откатывать созданные данные')
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',') if size.strip()]
+
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'benchmark_{time.time_ns()}', password=None)
+            now = timezone.now()
+            Habit.objects.bulk_create([
+                Habit(user=user, place='Дом', time=dt_time(8, i % 60), action=f'Действие {i}', duration=60,
+                      periodicity=i % 7 + 1, is_public=i % 2 == 0, reward='Кофе' if i % 3 == 0 else None,
+                      last_completed=now - timedelta(days=1) if i % 4 == 0 else None,
+                      next_reminder_at=now + timedelta(minutes=i))
+                for i in range(max(page_sizes))
+            ])
+            queryset = Habit.objects.filter(user=user)
+
+            results = [self.measure(queryset, size, options['iterations']) for size in page_sizes]
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps({'iterations': options['iterations'], 'results': results}, indent=2))
+
+    def measure(self, queryset, page_size, iterations):
+        def serializer_page():
+            return HabitSerializer(list(queryset[:page_size]), many=True).data
+
+        def values_page():
+            return habit_values_serializer.many(queryset.values(*habit_values_serializer.columns)[:page_size])
+
+        # Замер имеет смысл только при одинаковом JSON на выходе
+        identical = json.dumps(serializer_page(), default=str) == json.dumps(values_page(), default=str)
+        serializer_elapsed = self.timed(serializer_page, iterations)
+        values_elapsed = self.timed(values_page, iterations)
+        return {
+            'page_size': page_size,
+            'identical_output': identical,
+            'serializer_pages_per_second': round(iterations / serializer_elapsed, 1),
+            'values_pages_per_second': round(iterations / values_elapsed, 1),
+            'speedup': round(serializer_elapsed / values_elapsed, 2),
+        }
+
+    @staticmethod
+    def timed(func, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return time.perf_counter() - started
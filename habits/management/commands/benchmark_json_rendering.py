@@ -0,0 +1,83 @@
+import json
+import time
+from io import BytesIO
+from datetime import time as dt_time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from config import parsers as fast_parsers, renderers as fast_renderers
+from habits.models import Habit
+from habits.serializers import habit_values_serializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Замер рендеринга и разбора JSON страниц привычек: стандартный json DRF против FastJSONRenderer/FastJSONParser'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', default='5,20,100', help='Размеры страниц через запятую')
+        parser.add_argument('--iterations', type=int, default=500, help='Повторов на каждый размер страницы')
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',') if size.strip()]
+
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'json_benchmark_{time.time_ns()}', password=None)
+            now = timezone.now()
+            Habit.objects.bulk_create([
+                Habit(user=user, place='Дом', time=dt_time(8, i % 60), action=f'Действие {i}', duration=60,
+                      periodicity=i % 7 + 1, is_public=i % 2 == 0, reward='Кофе' if i % 3 == 0 else None,
+                      last_completed=now - timedelta(days=1) if i % 4 == 0 else None,
+                      next_reminder_at=now + timedelta(minutes=i))
+                for i in range(max(page_sizes))
+            ])
+            rows = list(Habit.objects.filter(user=user).values(*habit_values_serializer.columns))
+            transaction.set_rollback(True)
+
+        results = [self.measure(habit_values_serializer.many(rows[:size]), size, options['iterations'])
+                   for size in page_sizes]
+        self.stdout.write(json.dumps({
+            'iterations': options['iterations'],
+            'orjson': fast_renderers.orjson is not None,
+            'results': results,
+        }, indent=2))
+
+    def measure(self, page, page_size, iterations):
+        data = {'next': None, 'previous': None, 'results': page}
+        stdlib_renderer, fast_renderer = JSONRenderer(), fast_renderers.FastJSONRenderer()
+        stdlib_parser, fast_parser = JSONParser(), fast_parsers.FastJSONParser()
+        content = stdlib_renderer.render(data)
+
+        def parse(parser):
+            return parser.parse(BytesIO(content), 'application/json', {})
+
+        # Замер имеет смысл только при одинаковых байтах на выходе
+        identical = fast_renderer.render(data) == content and parse(fast_parser) == parse(stdlib_parser)
+        render_stdlib = self.timed(lambda: stdlib_renderer.render(data), iterations)
+        render_fast = self.timed(lambda: fast_renderer.render(data), iterations)
+        parse_stdlib = self.timed(lambda: parse(stdlib_parser), iterations)
+        parse_fast = self.timed(lambda: parse(fast_parser), iterations)
+        return {
+            'page_size': page_size,
+            'bytes': len(content),
+            'identical_output': identical,
+            'render_stdlib_pages_per_second': round(iterations / render_stdlib, 1),
+            'render_fast_pages_per_second': round(iterations / render_fast, 1),
+            'render_speedup': round(render_stdlib / render_fast, 2),
+            'parse_stdlib_pages_per_second': round(iterations / parse_stdlib, 1),
+            'parse_fast_pages_per_second': round(iterations / parse_fast, 1),
+            'parse_speedup': round(parse_stdlib / parse_fast, 2),
+        }
+
+    @staticmethod
+    def timed(func, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return time.perf_counter() - started
@@ -0,0 +1,47 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.importer import IMPORT_FORMATS, count_reports, import_habits, read_records
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт привычек пользователя из файла NDJSON или CSV пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON или CSV (с заголовком)')
+        parser.add_argument('--user', required=True, help='Имя пользователя-владельца привычек')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None,
+                            help='Формат файла; по умолчанию по расширению')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Строк в пачке (HABITS_IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--max-errors', type=int, default=20, help='Сколько ошибок строк показать в отчёте')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+        import_format = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'ndjson')
+
+        totals = {'created': 0, 'failed': 0}
+        errors = []
+        started = time.perf_counter()
+        with open(options['path'], 'rb') as source:
+            records = read_records(source, import_format)
+            for report in count_reports(import_habits(user, records, options['chunk_size']), totals):
+                if not report['ok'] and len(errors) < options['max_errors']:
+                    errors.append(report)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(json.dumps({
+            'user': user.username,
+            'format': import_format,
+            **totals,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round((totals['created'] + totals['failed']) / elapsed, 1) if elapsed else None,
+            'errors': errors,
+        }, ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:10
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_next_reminder_at(apps, schema_editor):
+    """Заполнение next_reminder_at для существующих привычек"""
+    Habit = apps.get_model('habits', 'Habit')
+    now = timezone.now()
+    current_minute = now.replace(second=0, microsecond=0)
+    today = now.astimezone(dt_timezone.utc).date()
+
+    batch = []
+    for habit in Habit.objects.filter(is_pleasant=False).iterator(chunk_size=1000):
+        if habit.last_completed:
+            day = habit.last_completed.astimezone(dt_timezone.utc).date() + timedelta(days=habit.periodicity)
+        else:
+            day = today
+        reminder = datetime.combine(day, habit.time, tzinfo=dt_timezone.utc)
+        if reminder < current_minute:
+            reminder = datetime.combine(today, habit.time, tzinfo=dt_timezone.utc)
+            if reminder < current_minute:
+                reminder += timedelta(days=1)
+        habit.next_reminder_at = reminder
+        batch.append(habit)
+
+        if len(batch) >= 1000:
+            Habit.objects.bulk_update(batch, ['next_reminder_at'])
+            batch = []
+
+    if batch:
+        Habit.objects.bulk_update(batch, ['next_reminder_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0003_rename_related_hobit_habit_related_habit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Следующее напоминание'),
+        ),
+        migrations.RunPython(fill_next_reminder_at, migrations.RunPython.noop),
+    ]
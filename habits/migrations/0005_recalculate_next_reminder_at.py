@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:20
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def recalculate_next_reminder_at(apps, schema_editor):
+    """Пересчёт next_reminder_at: время привычки теперь в часовом поясе пользователя"""
+    Habit = apps.get_model('habits', 'Habit')
+    now = timezone.now()
+
+    batch = []
+    for habit in Habit.objects.filter(is_pleasant=False).select_related('user').iterator(chunk_size=1000):
+        tz = ZoneInfo(habit.user.timezone)
+        today = now.astimezone(tz).date()
+        if habit.last_completed:
+            day = habit.last_completed.astimezone(tz).date() + timedelta(days=habit.periodicity)
+        else:
+            day = today
+        reminder = datetime.combine(day, habit.time, tzinfo=tz)
+        if reminder < now:
+            reminder = datetime.combine(today, habit.time, tzinfo=tz)
+            if reminder < now:
+                reminder = datetime.combine(today + timedelta(days=1), habit.time, tzinfo=tz)
+        habit.next_reminder_at = reminder.astimezone(dt_timezone.utc)
+        batch.append(habit)
+
+        if len(batch) >= 1000:
+            Habit.objects.bulk_update(batch, ['next_reminder_at'])
+            batch = []
+
+    if batch:
+        Habit.objects.bulk_update(batch, ['next_reminder_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0004_habit_next_reminder_at'),
+        ('users', '0002_user_timezone'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalculate_next_reminder_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_recalculate_next_reminder_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='habit',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Привычка', 'verbose_name_plural': 'Привычки'},
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='habit_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at', '-id'], name='habit_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_pleasant', False)), fields=['next_reminder_at'], name='habit_due_idx'),
+        ),
+        # Полный индекс по next_reminder_at заменён частичным habit_due_idx
+        migrations.AlterField(
+            model_name='habit',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Следующее напоминание'),
+        ),
+    ]
@@ -1,6 +1,37 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
 from django.db import models
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .validators import RULE_FIELDS, validate_habit
+
+
+class HabitQuerySet(models.QuerySet):
+    """Выборки привычек по владельцу, видимости и времени напоминания"""
+
+    def owned_by(self, user):
+        # Сравнение по user_id: ни join, ни загрузки пользователя; related_habit нужен правилам при изменении
+        return self.filter(user_id=user.pk).select_related('related_habit')
+
+    def public(self):
+        return self.filter(is_public=True)
+
+    def linking_to(self, habit_ids):
+        """Привычки, у которых related_habit - одна из habit_ids"""
+        return self.filter(related_habit_id__in=habit_ids)
+
+    def visible_to(self, user):
+        """Публичные привычки и собственные привычки пользователя"""
+        return self.filter(models.Q(is_public=True) | models.Q(user_id=user.pk))
+
+    def due_between(self, start, end):
+        """Неприятные привычки с напоминанием в окне (start, end]; start=None - все до end включительно"""
+        habits = self.filter(next_reminder_at__lte=end, is_pleasant=False)
+        if start is not None:
+            habits = habits.filter(next_reminder_at__gt=start)
+        # Порядок не нужен, а сортировка модели не покрывается индексом habit_due_idx
+        return habits.order_by()
 
 
 class Habit(models.Model):
@@ -27,39 +58,151 @@ class Habit(models.Model):
     is_public = models.BooleanField(default=False, verbose_name='Признак публичности')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     last_completed = models.DateTimeField(null=True, blank=True, verbose_name='Последнее выполнение')
+    next_reminder_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                            verbose_name='Следующее напоминание')
+
+    objects = HabitQuerySet.as_manager()
+
+    # Поля, от которых зависит момент следующего напоминания
+    SCHEDULE_FIELDS = {'time', 'periodicity', 'is_pleasant', 'last_completed'}
+    # Служебные поля планировщика: их запись не требует валидации
+    BOOKKEEPING_FIELDS = {'last_completed', 'next_reminder_at'}
 
     class Meta:
         verbose_name = 'Привычка'
         verbose_name_plural = 'Привычки'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Список привычек пользователя (HabitViewSet) в порядке Meta.ordering
+            models.Index(fields=['user', '-created_at', '-id'], name='habit_user_created_idx'),
+            # Публичная лента (PublicHabitViewSet): только публичные привычки
+            models.Index(fields=['-created_at', '-id'], name='habit_public_created_idx',
+                         condition=models.Q(is_public=True)),
+            # Планировщик напоминаний: диапазон по next_reminder_at среди неприятных привычек
+            models.Index(fields=['next_reminder_at'], name='habit_due_idx',
+                         condition=models.Q(is_pleasant=False)),
+        ]
 
     def __str__(self):
         return f"Я буду {self.action} в {self.time} в {self.place}"
 
     def clean(self):
-        # Валидация 1: Исключить одновременный выбор связанной привычки и указания вознаграждения
-        if self.related_habit and self.reward:
-            raise ValidationError('Нельзя указывать одновременно связанную привычку и вознаграждение.')
+        # Пять правил привычки - общие для модели, сериализатора и пакетных операций
+        validate_habit(self)
+
+    def mark_validated(self):
+        """Поля уже проверены (сериализатором): save() не повторит full_clean, пока они не изменятся"""
+        self._validated_state = self._field_state()
+
+    def _field_state(self):
+        return tuple(self.__dict__.get(field.attname) for field in self._meta.concrete_fields)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_schedule = instance._schedule_state()
+        instance._loaded_is_public = instance.__dict__.get('is_public')
+        instance._loaded_is_pleasant = instance.__dict__.get('is_pleasant')
+        return instance
 
-        # Валидация 2: Время выполнения должно быть не больше 120 секунд
-        if self.duration > 120:
-            raise ValidationError('Время выполнения не должно превышать 120 секунд.')
+    def _schedule_state(self):
+        return tuple(self.__dict__.get(field) for field in sorted(self.SCHEDULE_FIELDS))
 
-        # Валидация 3: В связанные привычки могут попадать только привычки с признаком приятной привычки
-        if self.related_habit and not self.related_habit.is_pleasant:
-            raise ValidationError('В связанные привычки могут попадать только приятные привычки.')
+    def may_be_linked(self):
+        """Связанной может быть только приятная привычка (правило 3) - сейчас или до изменения"""
+        return bool(self.is_pleasant or getattr(self, '_loaded_is_pleasant', False))
 
-        # Валидация 4: У приятной привычки не может быть вознаграждения или связанной привычки
+    def _schedule_changed(self):
+        return getattr(self, '_loaded_schedule', None) != self._schedule_state()
+
+    def calculate_next_reminder(self, now=None, after=None):
+        """Ближайший будущий момент напоминания (в UTC) с учётом периодичности
+
+        Время привычки задаётся в часовом поясе пользователя, поэтому планировщику
+        достаточно сравнить next_reminder_at с текущим моментом без пересчёта поясов.
+        Периодичность отсчитывается от последнего выполнения или от after - момента
+        только что отправленного напоминания, смотря что позже.
+        """
         if self.is_pleasant:
-            if self.reward:
-                raise ValidationError('У приятной привычки не может быть вознаграждения.')
-            if self.related_habit:
-                raise ValidationError('У приятной привычки не может быть связанной привычки.')
+            # Приятные привычки не напоминаются, в индекс планировщика они не попадают
+            return None
+
+        now = now or timezone.now()
+        tz = self.user.zoneinfo
+        today = now.astimezone(tz).date()
+
+        anchor = max(filter(None, (self.last_completed, after)), default=None)
+        if anchor:
+            day = anchor.astimezone(tz).date() + timedelta(days=self.periodicity)
+        else:
+            day = today
+        reminder = datetime.combine(day, self.time, tzinfo=tz)
 
-        # Валидация 5: Периодичность не реже чем 1 раз в 7 дней
-        if self.periodicity > 7:
-            raise ValidationError('Нельзя выполнять привычку реже, чем 1 раз в 7 дней.')
+        # Пропущенные напоминания не накапливаются - переносим на ближайшее время выполнения.
+        # Момент в прошлом планировщик уже не увидит: его окно (watermark, now] ушло вперёд
+        if reminder < now:
+            reminder = datetime.combine(today, self.time, tzinfo=tz)
+            if reminder < now:
+                reminder = datetime.combine(today + timedelta(days=1), self.time, tzinfo=tz)
+        return reminder.astimezone(dt_timezone.utc)
+
+    def validate_for_save(self, update_fields=None):
+        """Валидация перед сохранением: все поля или только изменяемые (кроме служебных)"""
+        if getattr(self, '_validated_state', None) == self._field_state():
+            return  # уже проверено в том же состоянии
+        if update_fields is None:
+            self.full_clean()
+            return
+
+        fields = set(update_fields) - self.BOOKKEEPING_FIELDS
+        if not fields:
+            return
+        self.clean_fields(exclude=[field.name for field in self._meta.fields if field.name not in fields])
+        if fields & set(RULE_FIELDS):
+            self.clean()
 
     def save(self, *args, **kwargs):
-        self.full_clean()  # Вызов валидации перед сохранением
+        update_fields = kwargs.get('update_fields')
+        # Вызов валидации перед сохранением
+        self.validate_for_save(update_fields)
+
+        if update_fields is None:
+            # Правка места или действия не должна сдвигать уже запланированное напоминание
+            if self._state.adding or self.next_reminder_at is None or self._schedule_changed():
+                self.next_reminder_at = self.calculate_next_reminder()
+        elif 'next_reminder_at' not in update_fields and self.SCHEDULE_FIELDS & set(update_fields):
+            self.next_reminder_at = self.calculate_next_reminder()
+            kwargs['update_fields'] = [*update_fields, 'next_reminder_at']
+
         super().save(*args, **kwargs)
+        self._validated_state = None
+        self._loaded_schedule = self._schedule_state()
+        self._loaded_is_public = self.is_public
+        self._loaded_is_pleasant = self.is_pleasant
+
+
+class HabitCompletion(models.Model):
+    """
+    Журнал выполнений привычек: только добавление, пишется пачками через буфер (habits.completions).
+    user дублирует habit.user - выборки по пользователю за период идут по индексу без join.
+    """
+    # Отдельные индексы по внешним ключам не нужны: их покрывают составные индексы ниже
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='completions',
+                              db_index=False, verbose_name='Привычка')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False,
+                             verbose_name='Пользователь')
+    completed_at = models.DateTimeField(verbose_name='Время выполнения')
+
+    class Meta:
+        verbose_name = 'Выполнение привычки'
+        verbose_name_plural = 'Выполнения привычек'
+        ordering = ['-completed_at', '-id']
+        indexes = [
+            # История привычки за период
+            models.Index(fields=['habit', '-completed_at', '-id'], name='completion_habit_time_idx'),
+            # История пользователя за период
+            models.Index(fields=['user', '-completed_at', '-id'], name='completion_user_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} - {self.completed_at}"
@@ -3,4 +3,5 @@ from rest_framework import permissions
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        # По user_id: без ленивой загрузки владельца
+        return obj.user_id == request.user.pk
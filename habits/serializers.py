@@ -1,5 +1,10 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Habit
+from .models import Habit, HabitCompletion
+from .validators import check_habit, serializer_state
 
 
 class HabitSerializer(serializers.ModelSerializer):
@@ -9,46 +14,194 @@ class HabitSerializer(serializers.ModelSerializer):
         read_only_fields = ('user', 'created_at', 'last_completed')
 
     def validate(self, data):
-        # Дублируем валидацию из модели для DRF
-        related_habit = data.get('related_habit')
-        reward = data.get('reward')
-        duration = data.get('duration', 120)
-        is_pleasant = data.get('is_pleasant', False)
-        periodicity = data.get('periodicity', 1)
-
-        # Валидация 1
-        if related_habit and reward:
-            raise serializers.ValidationError(
-                "Нельзя указывать одновременно связанную привычку и вознаграждение."
-            )
-
-        # Валидация 2
-        if duration > 120:
-            raise serializers.ValidationError(
-                "Время выполнения не должно превышать 120 секунд."
-            )
-
-        # Валидация 3
-        if related_habit and not related_habit.is_pleasant:
-            raise serializers.ValidationError(
-                "В связанные привычки могут попадать только приятные привычки."
-            )
-
-        # Валидация 4
-        if is_pleasant:
-            if reward:
-                raise serializers.ValidationError(
-                    "У приятной привычки не может быть вознаграждения."
-                )
-            if related_habit:
-                raise serializers.ValidationError(
-                    "У приятной привычки не может быть связанной привычки."
-                )
-
-        # Валидация 5
-        if periodicity > 7:
-            raise serializers.ValidationError(
-                "Нельзя выполнять привычку реже, чем 1 раз в 7 дней."
-            )
+        # Те же правила, что и в модели; при частичном изменении - вместе с текущими полями привычки
+        message = check_habit(serializer_state(data, self.instance))
+        if message:
+            raise serializers.ValidationError(message)
+        return data
+
+    def create(self, validated_data):
+        habit = Habit(**validated_data)
+        habit.mark_validated()
+        habit.save()
+        return habit
+
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.mark_validated()
+        instance.save()
+        return instance
+
+
+class PrefetchedHabitField(serializers.PrimaryKeyRelatedField):
+    """Связанная привычка из заранее загруженного context['related_habits'] - без запроса на каждый элемент"""
 
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        habit = self.context['related_habits'].get(pk)
+        if habit is None:
+            self.fail('does_not_exist', pk_value=data)
+        return habit
+
+
+class HabitBulkItemSerializer(HabitSerializer):
+    related_habit = PrefetchedHabitField(queryset=Habit.objects.all(), required=False, allow_null=True)
+
+    def validate(self, data):
+        # Правила привычек пакета проверяются все сразу в apply_bulk_operations
         return data
+
+
+class BulkOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['create', 'update', 'delete'])
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'Обязательное поле для изменения и удаления.'})
+        return attrs
+
+
+class HabitBulkSerializer(serializers.Serializer):
+    operations = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_operations(self, value):
+        limit = settings.HABITS_BULK_MAX_OPERATIONS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"Не больше {limit} операций за запрос.")
+        return value
+
+
+class HabitCompleteSerializer(serializers.Serializer):
+    """Отметка выполнения: время по умолчанию - текущее, в будущем - нельзя"""
+    completed_at = serializers.DateTimeField(required=False)
+
+    def validate_completed_at(self, value):
+        if value > timezone.now():
+            raise serializers.ValidationError('Время выполнения не может быть в будущем.')
+        return value
+
+
+class HabitCompletionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HabitCompletion
+        fields = ('id', 'habit', 'completed_at')
+
+
+class HabitCompletionFilterSerializer(serializers.Serializer):
+    """Параметры выборки журнала: привычка и полуинтервал [since, until)"""
+    habit = serializers.IntegerField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class HabitValuesSerializer:
+    """
+    Быстрое чтение: строки .values() (или __dict__ экземпляра) в тот же JSON, что и HabitSerializer.
+    Конвертеры полей собираются один раз из полей HabitSerializer, без прохода DRF по экземплярам.
+
+    fields - подмножество полей ответа (None - все), expand - связи, которые отдаются вложенным
+    объектом вместо id; в строках .values() они читаются из того же запроса через JOIN (колонки prefix).
+    Раскрывается только связанная привычка, которую зритель видит сам: публичная или своя.
+    """
+    serializer_class = HabitSerializer
+    expandable = ('related_habit',)
+    # Ключи keyset-пагинации нужны в строках, даже если их нет среди полей ответа
+    required_columns = ('id', 'created_at')
+
+    def __init__(self, fields=None, expand=(), prefix=''):
+        self.fields = fields
+        self.prefix = prefix
+        self.nested = {name: HabitValuesSerializer(prefix=f'{prefix}{name}__') for name in expand}
+        self._compiled = None
+
+    def _compile(self):
+        compiled = []
+        for name, field in self.serializer_class().fields.items():
+            if getattr(field, 'write_only', False):
+                continue
+            if self.fields is not None and name not in self.fields and name not in self.nested:
+                continue
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                compiled.append((name, Habit._meta.get_field(field.source).attname, None))
+            elif isinstance(field, serializers.DateTimeField):
+                compiled.append((name, field.source, _datetime_to_representation))
+            elif isinstance(field, serializers.TimeField):
+                compiled.append((name, field.source, _time_to_representation))
+            elif isinstance(field, (serializers.CharField, serializers.IntegerField,
+                                    serializers.BooleanField, serializers.ChoiceField)):
+                # Значения из БД уже нужного типа
+                compiled.append((name, field.source, None))
+            else:
+                compiled.append((name, field.source, field.to_representation))
+        return compiled
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = self._compile()
+        return self._compiled
+
+    @property
+    def columns(self):
+        """Колонки для queryset.values(...)"""
+        columns = [self.prefix + column for _, column, _ in self.compiled]
+        if not self.prefix:
+            columns += [column for column in self.required_columns if column not in columns]
+        for nested in self.nested.values():
+            columns += nested.columns
+        return columns
+
+    def to_representation(self, row, viewer_id=None):
+        """viewer_id - пользователь, для которого раскрываются связи: чужие непубличные остаются id"""
+        if isinstance(row, Habit):
+            return self._represent(row.__dict__, '', viewer_id, row)
+        return self._represent(row, self.prefix, viewer_id)
+
+    def _represent(self, row, prefix, viewer_id, instance=None):
+        data = {}
+        for name, column, convert in self.compiled:
+            value = row[prefix + column]
+            data[name] = value if convert is None or value is None else convert(value)
+        for name, nested in self.nested.items():
+            # Поле уже содержит id связанной привычки: None остаётся None, иначе - вложенный объект
+            if data[name] is None:
+                continue
+            if instance is not None:
+                related = getattr(instance, name)
+                if related.is_public or related.user_id == viewer_id:
+                    data[name] = nested.to_representation(related, viewer_id)
+            elif row[nested.prefix + 'is_public'] or row[nested.prefix + 'user_id'] == viewer_id:
+                data[name] = nested._represent(row, nested.prefix, viewer_id)
+        return data
+
+    def many(self, rows, viewer_id=None):
+        return [self.to_representation(row, viewer_id) for row in rows]
+
+
+@lru_cache(maxsize=64)
+def get_values_serializer(fields=None, expand=frozenset()):
+    """Собранный HabitValuesSerializer для набора полей и раскрытий (frozenset), один на процесс"""
+    return HabitValuesSerializer(fields=fields, expand=sorted(expand))
+
+
+def _datetime_to_representation(value):
+    # Как DateTimeField.to_representation: текущий часовой пояс, ISO 8601, UTC как 'Z'
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _time_to_representation(value):
+    return value.isoformat()
+
+
+habit_values_serializer = get_values_serializer()
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_public_feed_version, bump_user_habits_version
+from .models import Habit
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reschedule_habits_on_timezone_change(sender, instance, created, **kwargs):
+    """Пересчёт next_reminder_at привычек пользователя после смены часового пояса"""
+    if created or not instance.timezone_changed:
+        return
+
+    habits = list(Habit.objects.filter(user_id=instance.pk, is_pleasant=False))
+    for habit in habits:
+        habit.user = instance
+        habit.next_reminder_at = habit.calculate_next_reminder()
+    Habit.objects.bulk_update(habits, ['next_reminder_at'], batch_size=500)
+    if habits:
+        bump_user_habits_version(instance.pk)
+
+
+@receiver(pre_delete, sender=Habit)
+def remember_public_links(sender, instance, **kwargs):
+    # SET_NULL обнулит ссылки публичных привычек до post_delete и без сигналов для них
+    instance._linked_from_public = (
+        instance.may_be_linked() and Habit.objects.public().linking_to([instance.pk]).exists()
+    )
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def invalidate_public_feed(sender, instance, created=False, **kwargs):
+    """
+    Новая версия публичной ленты, если изменилась публичная привычка (или перестала быть публичной)
+    либо привычка, связанная с публичной: она раскрывается в ленте через ?expand=related_habit
+    """
+    if instance.is_public or getattr(instance, '_loaded_is_public', False) or linked_from_public(instance, created):
+        bump_public_feed_version()
+
+
+def linked_from_public(instance, created):
+    if hasattr(instance, '_linked_from_public'):
+        # Удаление: ссылки проверены в pre_delete
+        return instance._linked_from_public
+    return not created and instance.may_be_linked() and Habit.objects.public().linking_to([instance.pk]).exists()
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def bump_owner_habits_version(sender, instance, **kwargs):
+    """Любое изменение привычки меняет ETag списка и карточек привычек её владельца"""
+    bump_user_habits_version(instance.user_id)
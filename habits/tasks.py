@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .completions import flush_completions
+
+
+@shared_task
+def flush_habit_completions():
+    """Периодический сброс буфера выполнений привычек в БД"""
+    return flush_completions()
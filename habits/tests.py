@@ -1,9 +1,42 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import tracemalloc
+import uuid
+import fakeredis
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from types import SimpleNamespace
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Habit
+from config.parsers import FastJSONParser
+from config.renderers import FastJSONRenderer
+from .cache import get_public_feed_stats, get_public_feed_version, get_user_habits_version
+from .completions import (
+    RedisCompletionBuffer, flush_completions, get_completion_buffer, record_completion, reset_completion_buffer
+)
+from .models import Habit, HabitCompletion
 from .permissions import IsOwner
+from .serializers import HabitSerializer, habit_values_serializer
+from .tasks import flush_habit_completions
+from .validators import validate_habits
+from .views import HabitViewSet, PublicHabitViewSet
 
 User = get_user_model()
 
@@ -92,6 +125,321 @@ class HabitAPITest(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
 
 
+class HabitPaginationTest(APITestCase):
+    def setUp(self):
+        cache.clear()  # bulk_create и update не шлют сигналов - сбрасываем кэш ленты явно
+        self.user = User.objects.create_user(username='pager', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        Habit.objects.bulk_create([
+            Habit(user=self.user, place='Дом', time='08:00:00', action=f'Действие {i}',
+                  duration=60, is_public=True)
+            for i in range(12)
+        ])
+        # Половина привычек с одинаковым created_at - курсор обязан различать их по id
+        tie = timezone.now() - timedelta(days=1)
+        Habit.objects.filter(id__in=list(Habit.objects.values_list('id', flat=True)[:6])).update(created_at=tie)
+        self.expected = list(Habit.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_public_feed_keeps_page_format_by_default(self):
+        ids, pages = self.walk('/api/public-habits/')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages[0]['count'], 12)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_public_feed_cursor_opt_in(self):
+        ids, pages = self.walk('/api/public-habits/?pagination=cursor')
+        self.assertEqual(ids, self.expected)
+        self.assertNotIn('count', pages[0])
+        self.assertIsNone(pages[0]['previous'])
+        self.assertEqual(len(pages), 3)
+
+    def test_cursor_previous_link(self):
+        first = self.client.get('/api/public-habits/?pagination=cursor&page_size=4').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([h['id'] for h in back['results']], self.expected[:4])
+        self.assertIsNone(back['previous'])
+
+    def test_cursor_page_skips_count_query(self):
+        first = self.client.get('/api/public-habits/?pagination=cursor').data
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first['next'])
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_cursor_mode_selectable_per_request(self):
+        ids, _ = self.walk('/api/habits/?pagination=cursor')
+        self.assertEqual(ids, self.expected)
+        self.assertIn('count', self.client.get('/api/habits/').data)
+
+    def test_page_param_still_supported(self):
+        response = self.client.get('/api/public-habits/?page=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual([h['id'] for h in response.data['results']], self.expected[5:10])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/public-habits/?cursor=broken')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PublicFeedCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00', action='Бегать', duration=60, is_public=True
+        )
+
+    def test_second_request_served_from_cache(self):
+        first = self.client.get('/api/public-habits/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/public-habits/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+
+        stats = get_public_feed_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_public_habit_change_invalidates_cache(self):
+        self.client.get('/api/public-habits/')
+        self.habit.action = 'Плавать'
+        self.habit.save()
+
+        response = self.client.get('/api/public-habits/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['action'], 'Плавать')
+
+    def test_private_habit_change_keeps_cache(self):
+        version = get_public_feed_version()
+        private = Habit.objects.create(
+            user=self.user, place='Дом', time='09:00:00', action='Читать', duration=60
+        )
+        private.delete()
+        self.assertEqual(get_public_feed_version(), version)
+
+    def test_unpublish_and_delete_invalidate_cache(self):
+        habit = Habit.objects.get(pk=self.habit.pk)
+        version = get_public_feed_version()
+        habit.is_public = False
+        habit.save()
+        self.assertGreater(get_public_feed_version(), version)
+
+        self.client.get('/api/public-habits/')
+        public = Habit.objects.create(
+            user=self.user, place='Дом', time='09:00:00', action='Читать', duration=60, is_public=True
+        )
+        version = get_public_feed_version()
+        public.delete()
+        self.assertGreater(get_public_feed_version(), version)
+        self.assertEqual(self.client.get('/api/public-habits/').json()['results'], [])
+
+    def test_cache_stats_for_staff_only(self):
+        self.assertEqual(self.client.get('/api/public-habits/cache-stats/').status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/public-habits/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', response.data)
+
+
+class HabitETagTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='poller', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00', action='Бегать', duration=60
+        )
+
+    def test_matching_etag_returns_304_without_queries(self):
+        for url in ('/api/habits/', f'/api/habits/{self.habit.pk}/'):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_habit_change_changes_etag(self):
+        etag = self.client.get('/api/habits/')['ETag']
+        self.habit.action = 'Плавать'
+        self.habit.save()
+
+        response = self.client.get('/api/habits/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_expand_skips_etag(self):
+        owner = User.objects.create_user(username='bath_owner', password='testpass123')
+        bath = Habit.objects.create(
+            user=owner, place='Дом', time='21:00:00', action='Ванна', duration=60, is_pleasant=True, is_public=True
+        )
+        Habit.objects.filter(pk=self.habit.pk).update(related_habit=bath)
+        url = f'/api/habits/{self.habit.pk}/?expand=related_habit'
+
+        response = self.client.get(url)
+        self.assertNotIn('ETag', response)
+        # Правка чужой раскрытой привычки не меняет версию привычек текущего пользователя
+        bath.place = 'Баня'
+        bath.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(response.data['related_habit']['place'], 'Баня')
+
+    def test_etag_differs_per_page_and_user(self):
+        first = self.client.get('/api/habits/')['ETag']
+        self.assertNotEqual(self.client.get('/api/habits/?page_size=2')['ETag'], first)
+
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/habits/', HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class HabitValuesSerializerTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='21:30:00', action='Чай', duration=30, is_pleasant=True
+        )
+        self.habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00', action='Бегать', duration=60,
+            related_habit=pleasant, periodicity=3, is_public=True, last_completed=timezone.now()
+        )
+
+    def test_same_output_as_model_serializer(self):
+        expected = HabitSerializer(Habit.objects.all(), many=True).data
+        rows = Habit.objects.values(*habit_values_serializer.columns)
+        self.assertEqual(habit_values_serializer.many(rows), [dict(item) for item in expected])
+        for zone in ('UTC', 'Asia/Vladivostok'):
+            with timezone.override(zone):
+                self.assertEqual(habit_values_serializer.to_representation(self.habit),
+                                 HabitSerializer(self.habit).data)
+
+    def test_list_and_retrieve_use_fast_path(self):
+        with patch.object(HabitSerializer, 'to_representation') as mock_serializer:
+            for url in ('/api/habits/', f'/api/habits/{self.habit.pk}/', '/api/public-habits/'):
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        mock_serializer.assert_not_called()
+        self.assertEqual(self.client.get(f'/api/habits/{self.habit.pk}/').json(),
+                         json.loads(json.dumps(HabitSerializer(self.habit).data)))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_habit_serialization', '--page-sizes', '5,20', '--iterations', '2', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual([result['page_size'] for result in report['results']], [5, 20])
+        self.assertTrue(all(result['identical_output'] for result in report['results']))
+        self.assertFalse(Habit.objects.filter(action__startswith='Действие').exists())
+
+
+@override_settings(HABITS_BULK_MAX_OPERATIONS=5)
+class HabitBulkTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='syncer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='21:30:00', action='Чай', duration=30, is_pleasant=True
+        )
+        self.habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00', action='Бегать', duration=60
+        )
+
+    def new_habit(self, **extra):
+        return {'place': 'Дом', 'time': '07:00:00', 'action': 'Зарядка', 'duration': 60, **extra}
+
+    def test_bulk_create_update_delete(self):
+        operations = [
+            {'op': 'create', 'data': self.new_habit(related_habit=self.pleasant.id)},
+            {'op': 'create', 'data': self.new_habit(action='Отжимания', is_public=True)},
+            {'op': 'update', 'id': self.habit.id, 'data': {'time': '09:15:00', 'reward': 'Кофе'}},
+            {'op': 'delete', 'id': self.pleasant.id},
+        ]
+        response = self.client.post('/api/habits/bulk/', {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([result['op'] for result in results], ['create', 'create', 'update', 'delete'])
+        created = Habit.objects.get(id=results[1]['id'])
+        self.assertEqual(results[1]['data'], HabitSerializer(created).data)
+        self.assertIsNotNone(created.next_reminder_at)
+
+        self.habit.refresh_from_db()
+        self.assertEqual((str(self.habit.time), self.habit.reward), ('09:15:00', 'Кофе'))
+        self.assertEqual(self.habit.next_reminder_at, self.habit.calculate_next_reminder())
+        self.assertFalse(Habit.objects.filter(id=self.pleasant.id).exists())
+
+    def test_related_habits_fetched_once(self):
+        operations = [{'op': 'create', 'data': self.new_habit(related_habit=self.pleasant.id)} for _ in range(5)]
+        # Ровно один запрос на related_habit и один bulk INSERT на весь пакет (плюс транзакция)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/habits/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual((len(selects), len(inserts)), (1, 1))
+
+    def test_invalid_item_rolls_back_whole_batch(self):
+        other = User.objects.create_user(username='stranger', password='testpass123')
+        foreign = Habit.objects.create(user=other, place='Дом', time='10:00:00', action='Читать', duration=60)
+        operations = [
+            {'op': 'create', 'data': self.new_habit()},
+            {'op': 'update', 'id': self.habit.id, 'data': {'related_habit': self.pleasant.id, 'reward': 'Кофе'}},
+            {'op': 'update', 'id': self.habit.id, 'data': {'duration': 200}},
+            {'op': 'delete', 'id': foreign.id},
+            {'op': 'update'},
+        ]
+        response = self.client.post('/api/habits/bulk/', {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        results = response.data['results']
+        self.assertEqual([result['ok'] for result in results], [True, False, False, False, False])
+        self.assertIn('Нельзя указывать одновременно', str(results[1]['errors']))
+        self.assertIn('другой операцией', str(results[2]['errors']))
+        self.assertIn('не найдена', str(results[3]['errors']))
+        self.assertIn('id', results[4]['errors'])
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 2)
+
+    def test_partial_update_checked_against_current_state(self):
+        Habit.objects.filter(id=self.habit.id).update(related_habit=self.pleasant)
+        operations = [{'op': 'update', 'id': self.habit.id, 'data': {'reward': 'Кофе'}}]
+        response = self.client.post('/api/habits/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_operations_limit(self):
+        operations = [{'op': 'create', 'data': self.new_habit()} for _ in range(6)]
+        response = self.client.post('/api/habits/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('operations', response.data)
+
+    def test_bulk_invalidates_caches(self):
+        etag = self.client.get('/api/habits/')['ETag']
+        version = get_public_feed_version()
+        operations = [{'op': 'create', 'data': self.new_habit(is_public=True)}]
+        self.client.post('/api/habits/bulk/', {'operations': operations}, format='json')
+
+        self.assertEqual(self.client.get('/api/habits/', HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.assertNotEqual(get_public_feed_version(), version)
+
+
 class HabitValidationTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -255,6 +603,171 @@ class HabitModelValidationTest(TestCase):
         self.assertIn('не может быть вознаграждения', str(context.exception))
 
 
+class HabitValidationEngineTest(APITestCase):
+    """Одни правила и сообщения для модели, сериализатора и пакетных операций"""
+    CASES = [
+        ({'related': True, 'reward': 'Кофе'}, 'Нельзя указывать одновременно связанную привычку и вознаграждение.'),
+        ({'duration': 121}, 'Время выполнения не должно превышать 120 секунд.'),
+        ({'related': 'unpleasant'}, 'В связанные привычки могут попадать только приятные привычки.'),
+        ({'is_pleasant': True, 'reward': 'Кофе'}, 'У приятной привычки не может быть вознаграждения.'),
+        ({'is_pleasant': True, 'related': True}, 'У приятной привычки не может быть связанной привычки.'),
+        ({'periodicity': 8}, 'Нельзя выполнять привычку реже, чем 1 раз в 7 дней.'),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='validator', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='21:30:00', action='Чай', duration=30, is_pleasant=True
+        )
+        self.unpleasant = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00', action='Бегать', duration=60
+        )
+
+    def payload(self, related=None, **extra):
+        data = {'place': 'Дом', 'time': '07:00:00', 'action': 'Зарядка', 'duration': 60, **extra}
+        if related:
+            data['related_habit'] = (self.unpleasant if related == 'unpleasant' else self.pleasant).id
+        return data
+
+    def test_messages_identical_across_paths(self):
+        for case, message in self.CASES:
+            with self.subTest(message=message):
+                data = self.payload(**case)
+
+                # Периодичность вне choices API отклоняет ещё на уровне поля
+                if 'periodicity' not in case:
+                    response = self.client.post('/api/habits/', data, format='json')
+                    self.assertEqual(response.data['non_field_errors'], [message])
+
+                    response = self.client.post('/api/habits/bulk/', {'operations': [{'op': 'create', 'data': data}]},
+                                                format='json')
+                    self.assertEqual(response.data['results'][0]['errors']['non_field_errors'], [message])
+
+                habit = Habit(user=self.user, **{key: value for key, value in data.items() if key != 'related_habit'})
+                habit.related_habit_id = data.get('related_habit')
+                with self.assertRaisesMessage(ValidationError, message):
+                    habit.full_clean()
+
+    def test_partial_update_checks_current_state(self):
+        habit = Habit.objects.create(user=self.user, place='Дом', time='07:00:00', action='Зарядка', duration=60,
+                                     related_habit=self.pleasant)
+        response = self.client.patch(f'/api/habits/{habit.id}/', {'reward': 'Кофе'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Нельзя указывать одновременно', str(response.data))
+
+    def test_api_write_skips_repeated_model_validation(self):
+        # Было 4 и 6 запросов: full_clean повторно проверял существование user и related_habit
+        with self.assertNumQueries(2):  # related_habit + INSERT
+            response = self.client.post('/api/habits/', self.payload(related=True), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(3):  # своя привычка, новая related_habit, UPDATE
+            response = self.client.patch(f'/api/habits/{response.data["id"]}/',
+                                         {'duration': 30, 'related_habit': self.pleasant.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_changed_instance_is_validated_again(self):
+        habit = Habit(user=self.user, place='Дом', time='07:00:00', action='Зарядка', duration=60)
+        habit.mark_validated()
+        habit.duration = 500
+        with self.assertRaises(ValidationError):
+            habit.save()
+
+    def test_validate_habits_resolves_related_in_one_query(self):
+        habits = [
+            Habit(user=self.user, place='Дом', time='07:00:00', action='Зарядка', duration=60,
+                  related_habit_id=related.id)
+            for related in (self.pleasant, self.unpleasant, self.pleasant)
+        ]
+        with self.assertNumQueries(1):
+            errors = validate_habits(habits)
+        self.assertEqual(errors, {1: 'В связанные привычки могут попадать только приятные привычки.'})
+
+
+class HabitNarrowSaveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='scheduler', password='testpass123')
+        self.pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='21:30:00', action='Чай', duration=30, is_pleasant=True
+        )
+        habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00', action='Бегать', duration=60, related_habit=self.pleasant
+        )
+        self.habit = Habit.objects.select_related('user').get(pk=habit.pk)
+
+    def test_bookkeeping_save_skips_validation(self):
+        # Только UPDATE: ни проверок FK, ни загрузки related_habit
+        with self.assertNumQueries(1):
+            self.habit.last_completed = timezone.now()
+            self.habit.save(update_fields=['last_completed'])
+        now = timezone.now()
+        with self.assertNumQueries(1):
+            self.habit.last_completed = now
+            self.habit.next_reminder_at = self.habit.calculate_next_reminder(now)
+            self.habit.save(update_fields=['last_completed', 'next_reminder_at'])
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_reminder_at, self.habit.calculate_next_reminder(self.habit.last_completed))
+
+    def test_narrow_save_validates_only_changed_fields(self):
+        with self.assertNumQueries(1):
+            self.habit.place = 'Стадион'
+            self.habit.save(update_fields=['place'])
+
+        self.habit.place = 'x' * 300
+        with self.assertRaises(ValidationError):
+            self.habit.save(update_fields=['place'])
+
+    def test_rule_fields_still_checked(self):
+        habit = Habit.objects.get(pk=self.habit.pk)
+        habit.reward = 'Кофе'
+        with self.assertRaisesMessage(ValidationError, 'Нельзя указывать одновременно'):
+            habit.save(update_fields=['reward'])
+
+
+class HabitOwnershipTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.stranger = User.objects.create_user(username='stranger', password='testpass123')
+        self.habit = Habit.objects.create(
+            user=self.owner, place='Парк', time='08:00:00', action='Бегать', duration=60
+        )
+        self.url = f'/api/habits/{self.habit.id}/'
+
+    def test_non_owner_gets_404(self):
+        self.client.force_authenticate(user=self.stranger)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.patch(self.url, {'duration': 30}, format='json').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Habit.objects.filter(id=self.habit.id).exists())
+
+    def test_owner_detail_is_single_query(self):
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_public_detail_visible_to_others_only_when_public(self):
+        self.client.force_authenticate(user=self.stranger)
+        url = f'/api/public-habits/{self.habit.id}/'
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        Habit.objects.filter(id=self.habit.id).update(is_public=True)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_queryset_methods(self):
+        now = timezone.now()
+        Habit.objects.filter(id=self.habit.id).update(next_reminder_at=now)
+        self.assertEqual(list(Habit.objects.owned_by(self.owner)), [self.habit])
+        self.assertFalse(Habit.objects.owned_by(self.stranger).exists())
+        self.assertFalse(Habit.objects.visible_to(self.stranger).exists())
+        self.assertTrue(Habit.objects.visible_to(self.owner).exists())
+        self.assertTrue(Habit.objects.due_between(now - timedelta(minutes=1), now).exists())
+        self.assertFalse(Habit.objects.due_between(now, now + timedelta(minutes=1)).exists())
+
+
 class HabitPermissionsTest(APITestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -285,3 +798,635 @@ class HabitPermissionsTest(APITestCase):
         """Тест: другой пользователь не имеет доступа к чужому объекту"""
         request = type('Request', (), {'user': self.user2})()
         self.assertFalse(self.permission.has_object_permission(request, None, self.habit))
+
+
+class HabitQueryPlanTest(TestCase):
+    """Регрессия планов запросов: горячие выборки идут по индексам без полного прохода и сортировки"""
+    # Признаки плохого плана для каждого бэкенда
+    BAD_PLAN_MARKERS = {
+        'sqlite': ['SCAN habits_habit\n', 'USE TEMP B-TREE'],
+        'postgresql': ['Seq Scan on habits_habit', 'Sort'],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            [User(username=f'plan_user_{i}', password='!') for i in range(50)]
+        )
+        now = timezone.now()
+        habits = []
+        for i in range(2000):
+            is_pleasant = i % 5 == 0
+            habits.append(Habit(
+                user=users[i % len(users)],
+                place='Дом',
+                time='08:00:00',
+                action=f'Действие {i}',
+                duration=60,
+                is_pleasant=is_pleasant,
+                is_public=i % 10 == 1,
+                next_reminder_at=None if is_pleasant else now + timedelta(minutes=i),
+            ))
+        Habit.objects.bulk_create(habits)
+        cls.user = users[0]
+        cls.now = now
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexPlan(self, queryset):
+        plan = queryset.explain()
+        for marker in self.BAD_PLAN_MARKERS.get(connection.vendor, []):
+            self.assertNotIn(marker, plan + '\n', f"Неожиданный план запроса:\n{plan}")
+        return plan
+
+    def view_queryset(self, viewset_class):
+        view = viewset_class(action='list', request=SimpleNamespace(user=self.user))
+        return view.filter_queryset(view.get_queryset())
+
+    def test_user_habits_list_uses_index(self):
+        queryset = self.view_queryset(HabitViewSet)
+        self.assertIndexPlan(queryset[:5])
+        self.assertIndexPlan(queryset[10:15])
+
+    def test_public_habits_list_uses_index(self):
+        queryset = self.view_queryset(PublicHabitViewSet)
+        self.assertIndexPlan(queryset[:5])
+        self.assertIndexPlan(queryset[100:105])
+
+    def test_keyset_page_uses_index(self):
+        anchor = Habit.objects.filter(is_public=True)[100]
+        for viewset_class in (HabitViewSet, PublicHabitViewSet):
+            queryset = self.view_queryset(viewset_class).filter(
+                Q(created_at__lt=anchor.created_at) | Q(created_at=anchor.created_at, id__lt=anchor.id)
+            ).order_by('-created_at', '-id')
+            self.assertIndexPlan(queryset[:6])
+
+    def test_due_habits_scan_uses_index(self):
+        from bot.tasks import due_habits_queryset
+
+        window_start, window_end = self.now, self.now + timedelta(minutes=10)
+        for queryset in (
+            due_habits_queryset(window_start, window_end),
+            due_habits_queryset(None, window_end),
+            due_habits_queryset(window_start, window_end, shard=1, shards=4),
+        ):
+            self.assertIndexPlan(queryset.values_list('id', 'next_reminder_at'))
+
+
+class FastJSONRendererTest(APITestCase):
+    """orjson-рендерер и парсер: байт в байт как стандартные JSONRenderer/JSONParser DRF"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='jsonuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user, place='Дом', time='08:00:00.123456', action='Зарядка утром',
+            duration=60, periodicity=1, reward='Кофе'
+        )
+
+    def assertSameBytes(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_drf_renderer(self):
+        now = timezone.now().replace(microsecond=123456)
+        self.assertSameBytes(HabitSerializer(Habit.objects.all(), many=True).data)
+        self.assertSameBytes({
+            'datetime': now,
+            'naive': now.replace(tzinfo=None),
+            'date': now.date(),
+            'time': now.time(),
+            'decimal': Decimal('1.10'),
+            'uuid': uuid.uuid4(),
+            'lazy': gettext_lazy('Привычка'),
+            'error': ErrorDetail('Ошибка', code='invalid'),
+            'separators': 'строка\u2028абзац\u2029',
+            1: [None, True, 1.5, 2 ** 70],
+        })
+
+    def test_fallback_without_orjson(self):
+        data = HabitSerializer(self.habit).data
+        with patch('config.renderers.orjson', None):
+            self.assertSameBytes(data)
+
+    def test_indent_uses_drf_renderer(self):
+        data = {'results': [1, 2]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_api_response_and_request_body(self):
+        response = self.client.get(f'/api/habits/{self.habit.id}/')
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        response = self.client.post('/api/habits/', data=json.dumps({
+            'place': 'Парк', 'time': '07:30:00', 'action': 'Бег', 'duration': 90, 'periodicity': 2,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['place'], 'Парк')
+
+    def test_parser_matches_drf_parser(self):
+        content = json.dumps({'action': 'Бег\u2028', 'items': [1, 2.5, None, True]}, ensure_ascii=False).encode()
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(content), 'application/json', {}),
+            JSONParser().parse(BytesIO(content), 'application/json', {}),
+        )
+        latin = json.dumps({'action': 'café'}, ensure_ascii=False).encode('latin-1')
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(latin), 'application/json', {'encoding': 'latin-1'}),
+            {'action': 'café'},
+        )
+
+    def test_parser_rejects_invalid_json(self):
+        for content in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(content), 'application/json', {})
+        response = self.client.post('/api/habits/', data='{"place": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HabitExportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='testpass123')
+        self.other = User.objects.create_user(username='other_exporter', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def seed(self, user, count, start=0):
+        Habit.objects.bulk_create([
+            Habit(user=user, place='Дом, кухня', time='08:00:00', action=f'Действие "{i}"', duration=60,
+                  periodicity=i % 7 + 1, reward='Кофе' if i % 3 == 0 else None)
+            for i in range(start, start + count)
+        ])
+
+    def read_stream(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_export_matches_api_representation(self):
+        self.seed(self.user, 7)
+        self.seed(self.other, 3)
+
+        response, content = self.read_stream('/api/habits/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('habits.ndjson', response['Content-Disposition'])
+        lines = content.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 7)
+        expected = HabitSerializer(Habit.objects.filter(user=self.user), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], json.loads(json.dumps(expected)))
+
+    def test_csv_export(self):
+        self.seed(self.user, 3)
+
+        response, content = self.read_stream('/api/habits/export/?export_format=csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(StringIO(content.decode('utf-8'))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['action'] for row in rows}, {f'Действие "{i}"' for i in range(3)})
+        self.assertEqual(rows[0]['place'], 'Дом, кухня')
+        self.assertEqual(rows[0]['user'], str(self.user.id))
+
+    def test_unknown_format_rejected(self):
+        response = self.client.get('/api/habits/export/?export_format=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_all_is_staff_only(self):
+        self.seed(self.user, 2)
+        self.seed(self.other, 3)
+
+        response = self.client.get('/api/habits/export-all/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=User.objects.create_user(
+            username='staff_exporter', password='testpass123', is_staff=True
+        ))
+        _, content = self.read_stream('/api/habits/export-all/')
+        ids = [json.loads(line)['id'] for line in content.splitlines()]
+        self.assertEqual(ids, sorted(Habit.objects.values_list('id', flat=True)))
+
+    @override_settings(HABITS_EXPORT_CHUNK_SIZE=100)
+    def test_memory_stays_flat_as_rows_grow(self):
+        def peak_memory():
+            response = self.client.get('/api/habits/export/')
+            tracemalloc.start()
+            try:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.seed(self.user, 500)
+        small_size, small_peak = peak_memory()
+        self.seed(self.user, 4500, start=500)
+        large_size, large_peak = peak_memory()
+
+        # Выгрузка в 10 раз больше, а пик памяти - в пределах одной пачки строк
+        self.assertGreater(large_size, small_size * 9)
+        self.assertLess(large_peak, small_peak * 2)
+        self.assertLess(large_peak, large_size / 4)
+
+
+@override_settings(HABITS_IMPORT_CHUNK_SIZE=3)
+class HabitImportTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='importer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='21:00:00', action='Ванна', duration=60, is_pleasant=True
+        )
+
+    def row(self, **extra):
+        return {'place': 'Дом', 'time': '08:00:00', 'action': 'Зарядка', 'duration': 60, **extra}
+
+    def post_import(self, content, content_type='application/x-ndjson'):
+        response = self.client.post('/api/habits/import/', data=content, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return lines[:-1], lines[-1]['summary']
+
+    def test_ndjson_import_reports_every_row(self):
+        content = '\n'.join([
+            json.dumps(self.row(related_habit=self.pleasant.id)),
+            '{"place": ',
+            json.dumps({'time': '08:00:00', 'action': 'Зарядка', 'duration': 60}),
+            '',
+            json.dumps(self.row(related_habit=self.pleasant.id, reward='Кофе')),
+            json.dumps(self.row(action='Бег', is_public=True)),
+        ]).encode('utf-8')
+        version = get_user_habits_version(self.user.id)
+
+        reports, summary = self.post_import(content)
+
+        self.assertEqual(summary, {'created': 2, 'failed': 3})
+        self.assertEqual([report['line'] for report in reports], [1, 2, 3, 5, 6])
+        self.assertEqual([report['ok'] for report in reports], [True, False, False, False, True])
+        self.assertIn('place', reports[2]['errors'])
+        self.assertIn('Нельзя указывать одновременно', str(reports[3]['errors']))
+
+        created = Habit.objects.get(id=reports[0]['id'])
+        self.assertEqual(created.user, self.user)
+        self.assertEqual(created.related_habit, self.pleasant)
+        self.assertIsNotNone(created.next_reminder_at)
+        self.assertNotEqual(get_user_habits_version(self.user.id), version)
+
+    def test_csv_round_trip_from_export(self):
+        source = User.objects.create_user(username='csv_source', password='testpass123')
+        Habit.objects.bulk_create([
+            Habit(user=source, place='Парк, вход', time='07:30:00', action=f'Бег {i}', duration=90,
+                  periodicity=2, reward='Кофе' if i % 2 else None)
+            for i in range(5)
+        ])
+        self.client.force_authenticate(user=source)
+        exported = b''.join(self.client.get('/api/habits/export/?export_format=csv').streaming_content)
+        self.client.force_authenticate(user=self.user)
+
+        reports, summary = self.post_import(exported, content_type='text/csv')
+
+        self.assertEqual(summary, {'created': 5, 'failed': 0})
+        imported = Habit.objects.filter(id__in=[report['id'] for report in reports])
+        self.assertEqual(
+            sorted(imported.values_list('user', 'place', 'action', 'periodicity', 'reward')),
+            sorted((self.user.id, 'Парк, вход', f'Бег {i}', 2, 'Кофе' if i % 2 else None) for i in range(5)),
+        )
+
+    def test_csv_undecodable_lines_reported(self):
+        content = '\n'.join([
+            'place,time,action,duration',
+            'Парк,08:00:00,Бег,60',
+        ]).encode('utf-8') + b'\n\xff\xfe,08:00:00,\xff,60\n' + 'Дом,09:00:00,Зарядка,60\n'.encode('utf-8') + b'\xff'
+
+        reports, summary = self.post_import(content, content_type='text/csv')
+
+        self.assertEqual(summary, {'created': 2, 'failed': 2})
+        self.assertEqual([report['line'] for report in reports], [2, 3, 4, 5])
+        self.assertEqual([report['ok'] for report in reports], [True, False, True, False])
+        self.assertIn('UTF-8', str(reports[1]['errors']))
+        self.assertIn('UTF-8', str(reports[3]['errors']))
+
+    def test_queries_per_chunk_not_per_row(self):
+        def import_queries(count):
+            content = '\n'.join(json.dumps(self.row(related_habit=self.pleasant.id)) for _ in range(count))
+            with CaptureQueriesContext(connection) as queries:
+                _, summary = self.post_import(content.encode('utf-8'))
+            self.assertEqual(summary['created'], count)
+            return len(queries)
+
+        # Пачка: связанные привычки одним запросом и одна вставка
+        self.assertEqual(import_queries(6), 2 * import_queries(3))
+
+    def test_unknown_format_rejected(self):
+        response = self.client.post('/api/habits/import/?import_format=xml', data=b'', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', encoding='utf-8', delete=False) as source:
+            source.write('\n'.join(json.dumps(self.row(action=f'Действие {i}')) for i in range(7)))
+            source.write('\nnot json\n')
+        self.addCleanup(os.remove, source.name)
+
+        out = StringIO()
+        call_command('import_habits', source.name, user='importer', chunk_size=2, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual((report['created'], report['failed']), (7, 1))
+        self.assertEqual(report['errors'][0]['line'], 8)
+        self.assertEqual(Habit.objects.filter(user=self.user, action__startswith='Действие').count(), 7)
+
+
+class HabitSparseFieldsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='sparse', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='21:00:00', action='Ванна', duration=60, is_pleasant=True,
+            is_public=True
+        )
+        Habit.objects.bulk_create([
+            Habit(user=self.user, place='Парк', time='08:00:00', action=f'Бег {i}', duration=60, is_public=True,
+                  related_habit=self.pleasant if i % 2 == 0 else None)
+            for i in range(30)
+        ])
+
+    def test_fields_trim_select_and_payload(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/habits/?fields=id,action&page_size=10')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all(set(item) == {'id', 'action'} for item in response.data['results']))
+        select = queries.captured_queries[-1]['sql']
+        self.assertIn('"action"', select)
+        self.assertNotIn('"place"', select)
+
+    def test_expand_related_habit_inline(self):
+        response = self.client.get('/api/habits/?expand=related_habit&page_size=50')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = json.loads(json.dumps(HabitSerializer(self.pleasant).data))
+        results = {item['action']: item for item in response.data['results']}
+        self.assertEqual(results['Бег 0']['related_habit'], expected)
+        self.assertIsNone(results['Бег 1']['related_habit'])
+        self.assertEqual(
+            {key for key in results['Бег 0'] if key != 'related_habit'},
+            set(HabitSerializer(self.pleasant).data) - {'related_habit'},
+        )
+
+    def test_query_count_constant_across_page_sizes(self):
+        for url in ('/api/habits/?expand=related_habit&fields=id,related_habit&page_size={}',
+                    '/api/public-habits/?expand=related_habit&page_size={}'):
+            counts = []
+            for page_size in (2, 25):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url.format(page_size))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data['results']), page_size)
+                counts.append(len(queries))
+            self.assertEqual(counts[0], counts[1], url)
+
+    def test_cursor_pagination_with_fields(self):
+        response = self.client.get('/api/public-habits/?pagination=cursor&fields=action&page_size=20')
+        self.assertTrue(all(set(item) == {'action'} for item in response.data['results']))
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 11)
+
+    def test_retrieve_with_fields_and_expand(self):
+        habit = Habit.objects.filter(related_habit=self.pleasant).first()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/habits/{habit.id}/?fields=id,place&expand=related_habit')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(set(response.data), {'id', 'place', 'related_habit'})
+        self.assertEqual(response.data['related_habit']['action'], 'Ванна')
+
+        response = self.client.get(f'/api/public-habits/{habit.id}/?expand=related_habit')
+        self.assertEqual(response.data['related_habit']['id'], self.pleasant.id)
+
+    def test_private_related_habit_of_other_user_not_expanded(self):
+        owner = User.objects.create_user(username='secret_owner', password='testpass123')
+        secret = Habit.objects.create(
+            user=owner, place='SECRET PLACE', time='21:00:00', action='Секрет', duration=60, is_pleasant=True
+        )
+        linked = Habit.objects.create(
+            user=owner, place='Парк', time='08:00:00', action='Публичная', duration=60, is_public=True,
+            related_habit=secret
+        )
+
+        response = self.client.get('/api/public-habits/?expand=related_habit&page_size=50')
+        results = {item['id']: item for item in response.data['results']}
+        self.assertEqual(results[linked.id]['related_habit'], secret.id)
+        self.assertNotIn('SECRET PLACE', response.content.decode('utf-8'))
+
+        response = self.client.get(f'/api/public-habits/{linked.id}/?expand=related_habit')
+        self.assertEqual(response.data['related_habit'], secret.id)
+
+        # Владелец видит свою связанную привычку целиком
+        self.client.force_authenticate(user=owner)
+        response = self.client.get(f'/api/public-habits/{linked.id}/?expand=related_habit')
+        self.assertEqual(response.data['related_habit']['place'], 'SECRET PLACE')
+
+    def test_cached_public_feed_does_not_leak_private_related_habit(self):
+        owner = User.objects.create_user(username='feed_owner', password='testpass123')
+        secret = Habit.objects.create(
+            user=owner, place='SECRET PLACE', time='21:00:00', action='Секрет', duration=60, is_pleasant=True
+        )
+        linked = Habit.objects.create(
+            user=owner, place='Парк', time='08:00:00', action='Публичная', duration=60, is_public=True,
+            related_habit=secret
+        )
+        url = '/api/public-habits/?expand=related_habit&page_size=50'
+
+        # Первым страницу кэширует владелец, вторым читает другой пользователь
+        self.client.force_authenticate(user=owner)
+        first = self.client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.client.force_authenticate(user=self.user)
+        second = self.client.get(url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+
+        for response in (first, second):
+            self.assertNotIn('SECRET PLACE', response.content.decode('utf-8'))
+            results = {item['id']: item for item in json.loads(response.content)['results']}
+            self.assertEqual(results[linked.id]['related_habit'], secret.id)
+
+    def test_foreign_related_habit_not_expanded(self):
+        owner = User.objects.create_user(username='foreign_owner', password='testpass123')
+        foreign = Habit.objects.create(
+            user=owner, place='SECRET PLACE', time='21:00:00', action='Чужая', duration=60, is_pleasant=True
+        )
+        own = Habit.objects.create(
+            user=self.user, place='Дом', time='08:00:00', action='Своя', duration=60, related_habit=foreign
+        )
+
+        response = self.client.get(f'/api/habits/{own.id}/?expand=related_habit')
+        self.assertEqual(response.data['related_habit'], foreign.id)
+        response = self.client.get('/api/habits/?expand=related_habit&page_size=50')
+        results = {item['id']: item for item in response.data['results']}
+        self.assertEqual(results[own.id]['related_habit'], foreign.id)
+        self.assertNotIn('SECRET PLACE', response.content.decode('utf-8'))
+
+    def test_related_habit_change_invalidates_public_feed(self):
+        version = get_public_feed_version()
+        self.pleasant.is_public = False
+        self.pleasant.save()
+        self.assertNotEqual(get_public_feed_version(), version)
+
+        version = get_public_feed_version()
+        self.pleasant.place = 'Баня'
+        self.pleasant.save()
+        self.assertNotEqual(get_public_feed_version(), version)
+
+        version = get_public_feed_version()
+        self.pleasant.delete()
+        self.assertNotEqual(get_public_feed_version(), version)
+
+    def test_unknown_names_rejected(self):
+        for query in ('fields=id,password', 'expand=user'):
+            response = self.client.get(f'/api/habits/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(HABITS_COMPLETION_BUFFER_BACKEND='memory', HABITS_COMPLETION_FLUSH_SIZE=100)
+class HabitCompletionTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_completion_buffer()
+        self.addCleanup(reset_completion_buffer)
+        self.user = User.objects.create_user(username='completer', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.habits = [
+            Habit.objects.create(user=self.user, place='Дом', time='08:00:00', action=f'Зарядка {i}', duration=60)
+            for i in range(5)
+        ]
+
+    def complete(self, habit, **data):
+        return self.client.post(f'/api/habits/{habit.id}/complete/', data=data, format='json')
+
+    def test_complete_is_buffered_until_flush(self):
+        habit = self.habits[0]
+        version = get_user_habits_version(self.user.id)
+
+        response = self.complete(habit)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(HabitCompletion.objects.exists())
+        self.assertEqual(get_completion_buffer().size(), 1)
+
+        self.assertEqual(flush_habit_completions(), 1)
+        completion = HabitCompletion.objects.get()
+        self.assertEqual((completion.habit_id, completion.user_id), (habit.id, self.user.id))
+        habit.refresh_from_db()
+        self.assertEqual(habit.last_completed, completion.completed_at)
+        self.assertEqual(habit.next_reminder_at, habit.calculate_next_reminder())
+        self.assertNotEqual(get_user_habits_version(self.user.id), version)
+
+    def test_complete_validation(self):
+        other = User.objects.create_user(username='other_completer', password='testpass123')
+        foreign = Habit.objects.create(user=other, place='Дом', time='08:00:00', action='Чужая', duration=60)
+        self.assertEqual(self.complete(foreign).status_code, status.HTTP_404_NOT_FOUND)
+
+        future = timezone.now() + timedelta(hours=1)
+        self.assertEqual(self.complete(self.habits[0], completed_at=future.isoformat()).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_completion_buffer().size(), 0)
+
+    @override_settings(HABITS_COMPLETION_FLUSH_SIZE=4)
+    def test_full_buffer_flushes_in_request(self):
+        for habit in self.habits[:3]:
+            self.complete(habit)
+        self.assertFalse(HabitCompletion.objects.exists())
+
+        self.complete(self.habits[3])
+        self.assertEqual(HabitCompletion.objects.count(), 4)
+        self.assertEqual(get_completion_buffer().size(), 0)
+
+    def test_flush_queries_do_not_grow_with_completions(self):
+        def flush_queries(count):
+            now = timezone.now()
+            for i in range(count):
+                record_completion(self.habits[i % len(self.habits)], now - timedelta(minutes=i))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(flush_completions(), count)
+            return len(queries)
+
+        self.assertEqual(flush_queries(5), flush_queries(80))
+
+    def test_deleted_habit_skipped(self):
+        record_completion(self.habits[0], timezone.now())
+        record_completion(self.habits[1], timezone.now())
+        self.habits[1].delete()
+
+        self.assertEqual(flush_completions(), 1)
+        self.assertEqual(list(HabitCompletion.objects.values_list('habit_id', flat=True)), [self.habits[0].id])
+
+    def test_completions_range(self):
+        now = timezone.now()
+        for days in range(6):
+            record_completion(self.habits[days % 2], now - timedelta(days=days))
+        flush_completions()
+
+        response = self.client.get('/api/habits/completions/', {'page_size': 50})
+        self.assertEqual(response.data['count'], 6)
+        times = [item['completed_at'] for item in response.data['results']]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+        response = self.client.get('/api/habits/completions/', {
+            'habit': self.habits[0].id,
+            'since': (now - timedelta(days=4, hours=1)).isoformat(),
+            'until': now.isoformat(),
+        })
+        # Полуинтервал [since, until): выполнение в момент until не входит
+        self.assertEqual(response.data['count'], 2)
+        self.assertTrue(all(item['habit'] == self.habits[0].id for item in response.data['results']))
+
+    @override_settings(HABITS_COMPLETION_BUFFER_BACKEND='redis')
+    @patch('habits.completions.redis.Redis.from_url', side_effect=lambda url: fakeredis.FakeRedis())
+    def test_redis_buffer_push_pop_and_repush_on_failure(self, from_url):
+        reset_completion_buffer()
+        buffer = get_completion_buffer()
+        self.assertIsInstance(buffer, RedisCompletionBuffer)
+
+        self.assertEqual(buffer.push({'n': 1}), 1)
+        self.assertEqual(buffer.push({'n': 2}), 2)
+        self.assertEqual(buffer.pop(1), [{'n': 1}])
+        self.assertEqual(buffer.pop(10), [{'n': 2}])
+        self.assertEqual(buffer.pop(10), [])
+
+        for habit in self.habits[:3]:
+            self.assertEqual(self.complete(habit).status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(buffer.size(), 3)
+
+        # Ошибка записи возвращает пачку в Redis целиком
+        with patch('habits.completions._write_completions', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_completions()
+        self.assertEqual(buffer.size(), 3)
+        self.assertFalse(HabitCompletion.objects.exists())
+
+        self.assertEqual(flush_completions(), 3)
+        self.assertEqual(buffer.size(), 0)
+        self.assertEqual(
+            set(HabitCompletion.objects.values_list('habit_id', flat=True)),
+            {habit.id for habit in self.habits[:3]}
+        )
+
+    def test_range_reads_use_indexes(self):
+        now = timezone.now()
+        HabitCompletion.objects.bulk_create([
+            HabitCompletion(habit=self.habits[i % 5], user=self.user, completed_at=now - timedelta(minutes=i))
+            for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        bad_markers = {
+            'sqlite': ['SCAN habits_habitcompletion\n', 'USE TEMP B-TREE'],
+            'postgresql': ['Seq Scan on habits_habitcompletion', 'Sort'],
+        }.get(connection.vendor, [])
+        since = now - timedelta(hours=3)
+        for queryset in (
+            HabitCompletion.objects.filter(user=self.user, completed_at__gte=since),
+            HabitCompletion.objects.filter(habit=self.habits[0], completed_at__gte=since, completed_at__lt=now),
+        ):
+            plan = queryset[:20].explain()
+            for marker in bad_markers:
+                self.assertNotIn(marker, plan + '\n', f"Неожиданный план запроса:\n{plan}")
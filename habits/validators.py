@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+
+# Правила привычки в порядке проверки: (предикат нарушения, сообщение).
+# Предикаты получают объект с атрибутами привычки - экземпляр Habit или данные сериализатора
+HABIT_RULES = (
+    # Валидация 1: Исключить одновременный выбор связанной привычки и указания вознаграждения
+    (lambda habit: habit.related_habit and habit.reward,
+     'Нельзя указывать одновременно связанную привычку и вознаграждение.'),
+    # Валидация 2: Время выполнения должно быть не больше 120 секунд
+    (lambda habit: habit.duration is not None and habit.duration > 120,
+     'Время выполнения не должно превышать 120 секунд.'),
+    # Валидация 3: В связанные привычки могут попадать только привычки с признаком приятной привычки
+    (lambda habit: habit.related_habit and not habit.related_habit.is_pleasant,
+     'В связанные привычки могут попадать только приятные привычки.'),
+    # Валидация 4: У приятной привычки не может быть вознаграждения или связанной привычки
+    (lambda habit: habit.is_pleasant and habit.reward,
+     'У приятной привычки не может быть вознаграждения.'),
+    (lambda habit: habit.is_pleasant and habit.related_habit,
+     'У приятной привычки не может быть связанной привычки.'),
+    # Валидация 5: Периодичность не реже чем 1 раз в 7 дней
+    (lambda habit: habit.periodicity is not None and habit.periodicity > 7,
+     'Нельзя выполнять привычку реже, чем 1 раз в 7 дней.'),
+)
+
+RULE_FIELDS = ('related_habit', 'reward', 'duration', 'is_pleasant', 'periodicity')
+
+
+def check_habit(habit):
+    """Сообщение первого нарушенного правила или None"""
+    for violated, message in HABIT_RULES:
+        if violated(habit):
+            return message
+    return None
+
+
+def validate_habit(habit):
+    """Проверка одной привычки; нарушение - django ValidationError"""
+    message = check_habit(habit)
+    if message:
+        raise ValidationError(message)
+
+
+def validate_habits(habits):
+    """
+    Проверка списка привычек за один проход: все незагруженные related_habit читаются
+    одним запросом id__in. Возвращает {индекс: сообщение} для привычек с нарушениями.
+    """
+    attach_related_habits(habits)
+    errors = {}
+    for index, habit in enumerate(habits):
+        message = check_habit(habit)
+        if message:
+            errors[index] = message
+    return errors
+
+
+def resolve_related_habits(ids, known=None):
+    """{id: привычка} для ids одним запросом; привычки из known повторно не читаются"""
+    known = known or {}
+    Habit = apps.get_model('habits', 'Habit')
+    ids = set(ids) - {None}
+    resolved = {habit_id: known[habit_id] for habit_id in ids if habit_id in known}
+    missing = ids - resolved.keys()
+    if missing:
+        resolved.update((habit.id, habit) for habit in Habit.objects.filter(id__in=missing))
+    return resolved
+
+
+def attach_related_habits(habits):
+    """Подстановка related_habit в привычки, у которых он ещё не загружен"""
+    field = apps.get_model('habits', 'Habit')._meta.get_field('related_habit')
+    pending = [habit for habit in habits if habit.related_habit_id and not field.is_cached(habit)]
+    if pending:
+        known = {habit.id: habit for habit in habits if habit.id}
+        related = resolve_related_habits((habit.related_habit_id for habit in pending), known)
+        for habit in pending:
+            habit.related_habit = related.get(habit.related_habit_id)
+
+
+def serializer_state(data, instance=None):
+    """Итоговое состояние привычки для правил: данные запроса поверх текущих полей (или значений по умолчанию)"""
+    Habit = apps.get_model('habits', 'Habit')
+    state = {}
+    for name in RULE_FIELDS:
+        if name in data:
+            state[name] = data[name]
+        elif instance is not None:
+            state[name] = getattr(instance, name)
+        else:
+            state[name] = Habit._meta.get_field(name).get_default()
+    return SimpleNamespace(**state)
@@ -1,31 +1,127 @@
-from rest_framework import viewsets, permissions
-from rest_framework.pagination import PageNumberPagination
-from .models import Habit
-from .serializers import HabitSerializer
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status, viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .bulk import apply_bulk_operations
+from .export import EXPORT_FORMATS, batched, export_response
+from .importer import IMPORT_FORMATS, import_report_lines, read_records
+from .completions import record_completion
+from .cache import get_public_feed_page, get_public_feed_stats, get_user_habits_version, set_public_feed_page
+from .models import Habit, HabitCompletion
+from .pagination import HabitPageNumberPagination, HabitPagination
+from .serializers import (
+    HabitBulkSerializer, HabitCompleteSerializer, HabitCompletionFilterSerializer, HabitCompletionSerializer,
+    HabitSerializer, HabitValuesSerializer, get_values_serializer, habit_values_serializer
+)
 from .permissions import IsOwner
 
 
-class HabitPagination(PageNumberPagination):
-    page_size = 5
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+class UserHabitsETagMixin:
+    """
+    ETag для ответов по привычкам текущего пользователя из версии его привычек в кэше.
+    Совпавший If-None-Match получает 304 без запросов к таблице привычек и сериализации.
+    С ?expand ETag не выдаётся: раскрытая публичная привычка другого пользователя меняется без смены версии.
+    """
+
+    def get_etag(self, request):
+        version = get_user_habits_version(request.user.pk)
+        raw = f"{request.user.pk}:{version}:{request.build_absolute_uri()}:{request.accepted_media_type}"
+        return f'"{hashlib.md5(raw.encode("utf-8")).hexdigest()}"'
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if self.expand_query_param in request.query_params:
+            return handler(request, *args, **kwargs)
+
+        # Версия читается до выборки: изменение во время запроса даст новый ETag следующему
+        etag = self.get_etag(request)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+
+class FastReadMixin:
+    """
+    list/retrieve без ModelSerializer: строки .values() и заранее собранные конвертеры полей.
+    ?fields=id,action - только эти поля в SELECT и в ответе; ?expand=related_habit - связанная
+    привычка вложенным объектом из того же запроса (JOIN) вместо отдельного запроса клиента,
+    если она публичная или своя; иначе остаётся id.
+    """
+    values_serializer = habit_values_serializer
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_values_serializer(self):
+        fields = self.get_query_names(self.fields_query_param, [name for name, _, _ in self.values_serializer.compiled])
+        expand = self.get_query_names(self.expand_query_param, HabitValuesSerializer.expandable)
+        if fields is None and not expand:
+            return self.values_serializer
+        return get_values_serializer(fields, frozenset(expand or ()))
 
+    def get_viewer_id(self):
+        """Пользователь, для которого раскрываются непубличные связи (None - только публичные)"""
+        return self.request.user.pk
 
-class HabitViewSet(viewsets.ModelViewSet):
+    def get_query_names(self, param, allowed):
+        """Множество имён из ?param=a,b (None - параметра нет); неизвестное имя - 400"""
+        if param not in self.request.query_params:
+            return None
+        names = frozenset(
+            name.strip() for value in self.request.query_params.getlist(param)
+            for name in value.split(',') if name.strip()
+        )
+        unknown = names - set(allowed)
+        if unknown:
+            raise ValidationError({param: f"Неизвестные поля: {', '.join(sorted(unknown))}."})
+        return names
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'retrieve':
+            # Карточка читается экземпляром: раскрываемые связи - тем же запросом
+            expand = self.get_values_serializer().nested
+            if expand:
+                queryset = queryset.select_related(*expand)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.get_values_serializer()
+        queryset = self.filter_queryset(self.get_queryset()).values(*values_serializer.columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.many(page, self.get_viewer_id()))
+        return Response(values_serializer.many(queryset, self.get_viewer_id()))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Экземпляр нужен для проверки прав на объект; сериализуется он по тем же конвертерам
+        return Response(self.get_values_serializer().to_representation(self.get_object(), self.get_viewer_id()))
+
+
+class HabitViewSet(UserHabitsETagMixin, FastReadMixin, viewsets.ModelViewSet):
     serializer_class = HabitSerializer
     pagination_class = HabitPagination
+    pagination_mode = 'page'
 
     def get_queryset(self):
-        if self.action == 'list':
-            # Для списка привычек текущего пользователя
-            return Habit.objects.filter(user=self.request.user)
-        return Habit.objects.all()
+        # Только свои привычки: чужая получает 404 из выборки, а не 403 после загрузки
+        return Habit.objects.owned_by(self.request.user)
 
     def get_permissions(self):
         if self.action == 'list':
             permission_classes = [permissions.IsAuthenticated]
         elif self.action in ['create', 'retrieve', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAuthenticated, IsOwner]
+        elif self.action == 'export_all':
+            permission_classes = [permissions.IsAdminUser]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
@@ -33,11 +129,134 @@ class HabitViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'], serializer_class=HabitBulkSerializer)
+    def bulk(self, request):
+        """Пакет операций create/update/delete над своими привычками: всё или ничего, результат по каждой"""
+        serializer = HabitBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ok, results = apply_bulk_operations(request.user, serializer.validated_data['operations'])
+        return Response(
+            {'results': results},
+            status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST,
+        )
 
-class PublicHabitViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=True, methods=['post'], serializer_class=HabitCompleteSerializer)
+    def complete(self, request, pk=None):
+        """
+        Отметка выполнения своей привычки. Запись идёт через буфер и попадает в журнал
+        /api/habits/completions/ при ближайшем сбросе, поэтому ответ - 202
+        """
+        habit = self.get_object()
+        serializer = HabitCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        completed_at = serializer.validated_data.get('completed_at') or timezone.now()
+        record_completion(habit, completed_at)
+        return Response({'habit': habit.id, 'completed_at': completed_at}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], serializer_class=HabitCompletionSerializer)
+    def completions(self, request):
+        """Журнал выполнений своих привычек: ?habit=id, ?since= и ?until= (полуинтервал), новые сначала"""
+        params = HabitCompletionFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        # По пользователю - индекс completion_user_time_idx, по привычке - completion_habit_time_idx
+        queryset = HabitCompletion.objects.filter(user_id=request.user.pk)
+        if 'habit' in params.validated_data:
+            queryset = queryset.filter(habit_id=params.validated_data['habit'])
+        if 'since' in params.validated_data:
+            queryset = queryset.filter(completed_at__gte=params.validated_data['since'])
+        if 'until' in params.validated_data:
+            queryset = queryset.filter(completed_at__lt=params.validated_data['until'])
+
+        paginator = HabitPageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        data = HabitCompletionSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Потоковая выгрузка всех своих привычек: ?export_format=ndjson (по умолчанию) или csv"""
+        return export_response(self.get_queryset(), self.get_export_format(request))
+
+    @action(detail=False, methods=['get'], url_path='export-all')
+    def export_all(self, request):
+        """Потоковая выгрузка привычек всех пользователей для персонала, по возрастанию id"""
+        return export_response(
+            Habit.objects.order_by('id'), self.get_export_format(request), filename='habits-all'
+        )
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_habits(self, request):
+        """
+        Потоковый импорт своих привычек из тела запроса NDJSON или CSV (Content-Type text/csv
+        или ?import_format=csv). Ответ - NDJSON-отчёт по каждой строке и итог последней строкой.
+        Пачки сохраняются по мере чтения: оборванный импорт оставляет уже вставленные строки.
+        """
+        import_format = request.query_params.get('import_format')
+        if import_format is None:
+            import_format = 'csv' if request.content_type.startswith('text/csv') else 'ndjson'
+        if import_format not in IMPORT_FORMATS:
+            raise ValidationError({'import_format': f"Допустимые значения: {', '.join(IMPORT_FORMATS)}."})
+
+        # Тело читается построчно прямо из запроса, без парсеров DRF и request.data
+        records = read_records(request.stream or [], import_format)
+        return StreamingHttpResponse(
+            batched(import_report_lines(request.user, records), settings.HABITS_IMPORT_CHUNK_SIZE),
+            content_type='application/x-ndjson',
+        )
+
+    def get_export_format(self, request):
+        # Не ?format: его DRF занимает под выбор рендерера
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': f"Допустимые значения: {', '.join(EXPORT_FORMATS)}."})
+        return export_format
+
+
+class PublicHabitViewSet(FastReadMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = HabitSerializer
     pagination_class = HabitPagination
+    # Формат ответа по умолчанию прежний (page с count); keyset без OFFSET - через ?pagination=cursor
+    pagination_mode = 'page'
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Habit.objects.filter(is_public=True)
+        if self.action == 'list':
+            return Habit.objects.public()
+        # Карточка доступна для публичной или своей привычки
+        return Habit.objects.visible_to(self.request.user)
+
+    def get_viewer_id(self):
+        # Страница ленты кэшируется одна на всех пользователей - раскрываются только публичные связи
+        if self.action == 'list':
+            return None
+        return super().get_viewer_id()
+
+    def list(self, request, *args, **kwargs):
+        # Кэшируются только JSON-страницы: браузерный API рендерится как обычно
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        content = get_public_feed_page(request)
+        if content is not None:
+            response = HttpResponse(content, content_type=request.accepted_media_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        content = request.accepted_renderer.render(
+            response.data, request.accepted_media_type, self.get_renderer_context()
+        )
+        set_public_feed_page(request, content)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    @action(detail=False, url_path='cache-stats', permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Счётчики попаданий и промахов кэша публичной ленты"""
+        return Response(get_public_feed_stats())
@@ -5,8 +5,8 @@ from .models import User
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'telegram_chat_id', 'is_staff')
+    list_display = ('username', 'email', 'telegram_chat_id', 'timezone', 'is_staff')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     fieldsets = UserAdmin.fieldsets + (
-        ('Telegram', {'fields': ('telegram_chat_id',)}),
+        ('Telegram', {'fields': ('telegram_chat_id', 'timezone')}),
     )
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_user_cache
+
+User = get_user_model()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса пользователя на каждый запрос: пользователь собирается
+    по id из токена и снимку полей из LRU-кэша процесса (промах - один запрос к БД).
+    Проверки те же, что у JWTAuthentication.get_user.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            # В токене id строкой - приводим к типу ключа кэша
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        values = get_user_cache().get(user_id)
+        if values is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        # Деактивация и смена пароля действуют сразу в этом процессе и не позже USER_CACHE_TTL в остальных
+        if api_settings.CHECK_USER_IS_ACTIVE and not values['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(values['password']):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return User.from_cached(values)
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class UserCache:
+    """
+    LRU-кэш строк пользователей в памяти процесса с ограничением размера и временем жизни.
+    Хранит неизменяемые снимки полей ({attname: значение}), а не экземпляры: каждый запрос
+    получает свой объект пользователя.
+    """
+
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Номер инвалидации: строка, прочитанная до invalidate(), в кэш уже не попадёт
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, user_id):
+        """Снимок полей пользователя: из кэша или одним запросом к БД; None - пользователя нет"""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, values = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return values
+                del self._entries[user_id]
+                self.expirations += 1
+            self.misses += 1
+            generation = self._generation
+
+        values = self.load(user_id)
+        if values is not None and self.max_size > 0:
+            with self._lock:
+                if generation != self._generation:
+                    return values
+                self._entries[user_id] = (now + self.ttl, values)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return values
+
+    def load(self, user_id):
+        User = get_user_model()
+        fields = [field.attname for field in User._meta.concrete_fields]
+        return User.objects.filter(pk=user_id).values(*fields).first()
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / total, 4) if total else None,
+            }
+
+
+def get_user_cache():
+    """Кэш пользователей процесса, настроенный через USER_CACHE_*"""
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UserCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL)
+    return _cache
+
+
+def reset_user_cache():
+    """Сброс кэша (после изменения настроек и в тестах)"""
+    global _cache
+
+    with _cache_lock:
+        _cache = None
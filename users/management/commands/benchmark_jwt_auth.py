@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import CachedJWTAuthentication
+from users.cache import get_user_cache
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Замер накладных расходов JWT-аутентификации на запрос: simplejwt против кэша пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Количество аутентификаций')
+        parser.add_argument('--users', type=int, default=10, help='Количество разных пользователей')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = [User.objects.create_user(username=f'auth_benchmark_{i}_{time.time_ns()}', password=None)
+                     for i in range(options['users'])]
+            factory = RequestFactory()
+            requests = [
+                Request(factory.get('/api/habits/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'))
+                for user in users
+            ]
+            get_user_cache().clear()
+
+            report = {
+                'requests': options['requests'],
+                'users': options['users'],
+                'simplejwt': self.measure(JWTAuthentication(), requests, options['requests']),
+                'cached': self.measure(CachedJWTAuthentication(), requests, options['requests']),
+                'user_cache': get_user_cache().stats(),
+            }
+            transaction.set_rollback(True)
+
+        report['speedup'] = round(report['simplejwt']['microseconds_per_request']
+                                  / report['cached']['microseconds_per_request'], 2)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def measure(authenticator, requests, count):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for i in range(count):
+                authenticator.authenticate(requests[i % len(requests)])
+            elapsed = time.perf_counter() - started
+        return {
+            'microseconds_per_request': round(elapsed / count * 10 ** 6, 1),
+            'queries_per_request': round(len(queries) / count, 3),
+        }
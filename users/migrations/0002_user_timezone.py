@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:19
+
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default='Europe/Moscow', max_length=63, validators=[users.models.validate_timezone], verbose_name='Часовой пояс'),
+        ),
+    ]
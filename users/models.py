@@ -1,9 +1,35 @@
-from django.db import models
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, models
 from django.contrib.auth.models import AbstractUser
 
 
+@lru_cache(maxsize=1)
+def _available_timezones():
+    return available_timezones()
+
+
+def validate_timezone(value):
+    # Сверка со списком IANA: ZoneInfo('Europe') и слишком длинные имена падают с OSError, а не ValueError
+    zones = _available_timezones()
+    if zones:
+        if value not in zones:
+            raise ValidationError(f'Неизвестный часовой пояс: {value}')
+        return
+    # Без базы tzdata список пуст - проверяем загрузкой пояса
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        raise ValidationError(f'Неизвестный часовой пояс: {value}')
+
+
 class User(AbstractUser):
     telegram_chat_id = models.CharField(max_length=50, blank=True, null=True, verbose_name='Telegram Chat ID')
+    timezone = models.CharField(max_length=63, default=settings.TIME_ZONE, validators=[validate_timezone],
+                                verbose_name='Часовой пояс')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -11,3 +37,40 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_timezone = instance.__dict__.get('timezone')
+        return instance
+
+    @classmethod
+    def from_cached(cls, values):
+        """Пользователь запроса из снимка полей кэша, без обращения к БД"""
+        names = list(values)
+        instance = cls.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+        instance._cached_values = values
+        return instance
+
+    @property
+    def zoneinfo(self):
+        return ZoneInfo(self.timezone)
+
+    @property
+    def timezone_changed(self):
+        """Часовой пояс изменён с момента загрузки из БД (время напоминаний нужно пересчитать)"""
+        return not self._state.adding and getattr(self, '_loaded_timezone', self.timezone) != self.timezone
+
+    def save(self, *args, **kwargs):
+        cached_values = getattr(self, '_cached_values', None)
+        if cached_values is not None and kwargs.get('update_fields') is None:
+            # Снимок из кэша может отставать от БД на USER_CACHE_TTL: пишем только изменённые поля
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and self.__dict__.get(field.attname) != cached_values.get(field.attname)
+            ]
+        super().save(*args, **kwargs)
+        if cached_values is not None:
+            self._cached_values = {field.attname: self.__dict__.get(field.attname)
+                                   for field in self._meta.concrete_fields}
+        self._loaded_timezone = self.timezone
@@ -11,7 +11,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'password', 'password_confirm', 'telegram_chat_id')
+        fields = ('id', 'username', 'email', 'password', 'password_confirm', 'telegram_chat_id', 'timezone')
         read_only_fields = ('id',)
 
     def validate(self, attrs):
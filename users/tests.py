@@ -1,7 +1,19 @@
+import json
+from io import StringIO
+
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from .cache import UserCache, get_user_cache
+from .models import validate_timezone
 
 User = get_user_model()
 
@@ -42,6 +54,17 @@ class UserAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(User.objects.filter(username='newuser').exists())
 
+    def test_registration_rejects_invalid_timezone(self):
+        for index, value in enumerate(('Europe', 'x' * 300)):
+            response = self.client.post('/api/register/', {
+                'username': f'tzuser{index}',
+                'password': 'testpass123',
+                'password_confirm': 'testpass123',
+                'timezone': value,
+            })
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, value)
+            self.assertIn('timezone', response.data)
+
     def test_user_login(self):
         """Тест аутентификации пользователя"""
         # Сначала создаем пользователя
@@ -77,3 +100,86 @@ class UserAPITest(APITestCase):
         # Проверяем, что chat_id сохранился
         user.refresh_from_db()
         self.assertEqual(user.telegram_chat_id, '123456789')
+
+    def test_set_timezone(self):
+        """Тест установки часового пояса"""
+        user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=user)
+
+        response = self.client.post('/api/set-timezone/', {'timezone': 'Asia/Yekaterinburg'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual(user.timezone, 'Asia/Yekaterinburg')
+
+        # Несуществующий пояс, каталог базы tzdata и слишком длинное имя - 400, а не 500
+        for value in ('Mars/Olympus', 'Europe', 'Europe/' + 'x' * 300):
+            response = self.client.post('/api/set-timezone/', {'timezone': value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, value)
+        user.refresh_from_db()
+        self.assertEqual(user.timezone, 'Asia/Yekaterinburg')
+
+    def test_validate_timezone_without_tzdata_list(self):
+        with patch('users.models._available_timezones', return_value=set()):
+            validate_timezone('Europe/Moscow')
+            for value in ('Europe', 'x' * 300, 'Mars/Olympus'):
+                with self.assertRaises(ValidationError):
+                    validate_timezone(value)
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        get_user_cache().clear()
+        self.user = User.objects.create_user(username='jwtuser', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_repeated_requests_skip_user_query(self):
+        self.client.get('/api/habits/')
+        hits = get_user_cache().stats()['hits']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/habits/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('users_user' in query['sql'] for query in queries))
+        self.assertEqual(get_user_cache().stats()['hits'], hits + 1)
+
+    def test_user_save_invalidates_cache(self):
+        self.client.get('/api/habits/')
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get('/api/habits/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_saves_only_changed_fields(self):
+        """Тест: устаревший снимок из кэша не затирает поля, изменённые в другом процессе"""
+        self.client.get('/api/habits/')
+        User.objects.filter(pk=self.user.pk).update(email='fresh@example.com')  # без сигналов, как в другом процессе
+
+        response = self.client.post('/api/set-timezone/', {'timezone': 'Asia/Tokyo'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.timezone, self.user.email), ('Asia/Tokyo', 'fresh@example.com'))
+
+    def test_lru_eviction_and_ttl(self):
+        now = [0.0]
+        cache = UserCache(max_size=2, ttl=10, clock=lambda: now[0])
+        users = [User.objects.create_user(username=f'lru{i}', password='x') for i in range(3)]
+        for user in users:
+            cache.get(user.pk)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        with self.assertNumQueries(0):
+            cache.get(users[2].pk)
+        now[0] = 11
+        with self.assertNumQueries(1):
+            cache.get(users[2].pk)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_jwt_auth', '--requests', '20', '--users', '2', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['simplejwt']['queries_per_request'], 1)
+        self.assertLess(report['cached']['queries_per_request'], 1)
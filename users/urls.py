@@ -1,10 +1,11 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, set_telegram_chat_id
+from .views import RegisterView, set_telegram_chat_id, set_timezone
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('set-telegram-chat-id/', set_telegram_chat_id, name='set_telegram_chat_id'),
+    path('set-timezone/', set_timezone, name='set_timezone'),
 ]
@@ -3,6 +3,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from .models import validate_timezone
 from .serializers import UserSerializer
 
 User = get_user_model()
@@ -34,3 +36,32 @@ def set_telegram_chat_id(request):
         {'message': 'Telegram chat_id успешно установлен'},
         status=status.HTTP_200_OK
     )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def set_timezone(request):
+    """Установка часового пояса пользователя (время привычек задаётся в нём)"""
+    tz_name = request.data.get('timezone')
+
+    if not tz_name:
+        return Response(
+            {'error': 'timezone обязателен'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        validate_timezone(tz_name)
+    except ValidationError as e:
+        return Response(
+            {'error': e.messages[0]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    request.user.timezone = tz_name
+    request.user.save()
+
+    return Response(
+        {'message': 'Часовой пояс успешно установлен'},
+        status=status.HTTP_200_OK
+    )